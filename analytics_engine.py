@@ -0,0 +1,793 @@
+# analytics_engine.py – copie colonnaire en mémoire des deals de trading (numpy)
+#
+# Mêmes résultats que les *_from_db de dashboard_db (mêmes règles : deals de
+# trading seulement, fenêtre "derniers N jours" UTC, winrate sur les sorties),
+# mais calculés par opérations vectorisées sur des tableaux numpy au lieu de
+# SQL + boucles Python. La copie est complétée par rowid après chaque sync
+# (ajouts seulement) et rechargée si des deals existants ont été réécrits.
+import os
+import math
+import time
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+import dashboard_db as db
+
+logger = logging.getLogger("analytics_engine")
+
+MS_PER_DAY = 86_400_000
+# annualisation des ratios journaliers (jours de trading par an)
+TRADING_DAYS_PER_YEAR = 252
+ENGINE_LOAD_CHUNK = int(os.getenv("ANALYTICS_ENGINE_LOAD_CHUNK", "50000"))
+
+# (colonne en mémoire, dtype) — symbol / account / type / entry_type codés en entiers
+COLUMNS = (
+    ("time_ms", np.int64),
+    ("profit", np.float64),
+    ("commission", np.float64),
+    ("swap", np.float64),
+    ("volume", np.float64),
+    ("symbol", np.int32),
+    ("account", np.int32),
+    ("type", np.int32),
+    ("entry_type", np.int32),
+)
+
+_LOAD_SQL = f"""
+    SELECT rowid, time_ms, profit, commission, swap, volume,
+           COALESCE(symbol, ''), COALESCE(account_id, ''), type, entry_type
+    FROM deals
+    WHERE rowid > ?
+      AND {db._rollup_condition_sql("deals", "day")}
+    ORDER BY rowid
+"""
+
+
+class _Codes:
+    """Dictionnaire texte ↔ code entier (colonnes catégorielles)."""
+
+    def __init__(self):
+        self.values: List[Optional[str]] = []
+        self._codes: Dict[Optional[str], int] = {}
+
+    def code(self, value: Optional[str]) -> int:
+        c = self._codes.get(value)
+        if c is None:
+            c = self._codes[value] = len(self.values)
+            self.values.append(value)
+        return c
+
+    def lookup(self, value: Optional[str]) -> int:
+        """Code existant, -1 si la valeur n'a jamais été vue (filtre vide)."""
+        return self._codes.get(value, -1)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+
+class PerformanceMetrics:
+    """
+    Statistiques de performance des sorties (deals de clôture), mises à jour
+    par lot (numpy) dans l'ordre chronologique :
+    profit factor, espérance, gain / perte moyens, séries, perte consécutive
+    max, Sharpe / Sortino sur la PNL journalière (jours tradés).
+    Mêmes conventions que le summary : gain si profit > 0, perte sinon.
+    - totaux et PNL journalière : indépendants de l'ordre, toujours à jour
+    - séries (streaks, perte consécutive) : dépendent de l'ordre ; un lot
+      antérieur au dernier deal compté les marque `sequence_stale`
+    """
+
+    def __init__(self):
+        self.last_ms = -1              # dernier deal compté (ordre chronologique)
+        self.version = 0               # incrémenté à chaque lot
+        self.sequence_stale = False    # séries à recalculer (deal reçu dans le désordre)
+        self.trades = 0
+        self.wins = 0
+        self.losses = 0
+        self.gross_profit = 0.0
+        self.gross_loss = 0.0          # somme des pertes (≤ 0)
+        # PNL par jour + sommes pour écart-type / semi-écart
+        self.daily: Dict[int, float] = {}
+        self._sum = 0.0
+        self._sum_sq = 0.0
+        self._sum_down_sq = 0.0
+        self._reset_sequence()
+
+    def _reset_sequence(self) -> None:
+        self.streak = 0                # > 0 : gains consécutifs, < 0 : pertes
+        self.longest_win_streak = 0
+        self.longest_loss_streak = 0
+        self.loss_run = 0.0            # cumul de la série de pertes en cours
+        self.max_consecutive_loss = 0.0
+
+    def _add_totals(self, times: np.ndarray, profits: np.ndarray) -> None:
+        """Compteurs, sommes et PNL journalière (indépendants de l'ordre)."""
+        win = profits > 0
+        wins = int(np.count_nonzero(win))
+        self.trades += len(profits)
+        self.wins += wins
+        self.losses += len(profits) - wins
+        self.gross_profit += float(profits[win].sum())
+        self.gross_loss += float(profits[~win].sum())
+        self._sum += float(profits.sum())
+
+        days, day_pnl = _group_sum(times // MS_PER_DAY, profits)
+        for day, pnl in zip(days.tolist(), day_pnl.tolist()):
+            old = self.daily.get(day, 0.0)
+            new = old + pnl
+            self.daily[day] = new
+            self._sum_sq += new * new - old * old
+            self._sum_down_sq += min(new, 0.0) ** 2 - min(old, 0.0) ** 2
+
+    def _add_sequence(self, profits: np.ndarray) -> None:
+        """Séries, à partir de l'état courant (profits triés par temps) : une passe numpy par plages."""
+        win = profits > 0
+        starts = np.flatnonzero(np.r_[True, win[1:] != win[:-1]])
+        lengths = np.diff(np.r_[starts, len(win)])
+        run_win = win[starts]
+        run_sum = np.add.reduceat(profits, starts)
+
+        # la première plage prolonge la série en cours si même signe
+        if run_win[0] and self.streak > 0:
+            lengths[0] += self.streak
+        elif not run_win[0] and self.streak < 0:
+            lengths[0] -= self.streak
+            run_sum[0] += self.loss_run
+
+        if run_win.any():
+            self.longest_win_streak = max(self.longest_win_streak, int(lengths[run_win].max()))
+        if not run_win.all():
+            self.longest_loss_streak = max(self.longest_loss_streak, int(lengths[~run_win].max()))
+            # pertes ≤ 0 : le cumul d'une série ne fait que baisser, son minimum est son total
+            self.max_consecutive_loss = min(self.max_consecutive_loss, float(run_sum[~run_win].min()))
+        self.streak = int(lengths[-1]) if run_win[-1] else -int(lengths[-1])
+        self.loss_run = 0.0 if run_win[-1] else float(run_sum[-1])
+
+    def add_many(self, times: np.ndarray, profits: np.ndarray) -> None:
+        """Deals triés par temps (epoch ms), postérieurs au dernier deal compté."""
+        if not len(times):
+            return
+        self._add_totals(times, profits)
+        if not self.sequence_stale:
+            self._add_sequence(profits)
+        self.last_ms = max(self.last_ms, int(times[-1]))
+        self.version += 1
+
+    def add_unordered(self, times: np.ndarray, profits: np.ndarray) -> None:
+        """Deals antérieurs au dernier compté : totaux à jour, séries à recalculer."""
+        if not len(times):
+            return
+        self._add_totals(times, profits)
+        self.sequence_stale = True
+        self.last_ms = max(self.last_ms, int(times[-1]))
+        self.version += 1
+
+    def set_sequence(self, profits: np.ndarray) -> None:
+        """Recalcule les séries depuis TOUS les profits de la clé, triés par temps."""
+        self._reset_sequence()
+        if len(profits):
+            self._add_sequence(profits)
+        self.sequence_stale = False
+
+    def to_dict(self) -> Dict[str, Any]:
+        n_days = len(self.daily)
+        mean = self._sum / n_days if n_days else 0.0
+        sharpe = sortino = None
+        if n_days >= 2:
+            variance = max(self._sum_sq - n_days * mean * mean, 0.0) / (n_days - 1)
+            if variance > 0:
+                sharpe = mean / math.sqrt(variance)
+            downside = math.sqrt(self._sum_down_sq / n_days)
+            if downside > 0:
+                sortino = mean / downside
+        annual = math.sqrt(TRADING_DAYS_PER_YEAR)
+
+        def r(value: Optional[float], digits: int = 2) -> Optional[float]:
+            return round(value, digits) if value is not None else None
+
+        return {
+            "trades": self.trades,
+            "wins": self.wins,
+            "losses": self.losses,
+            "winrate": r(self.wins / self.trades * 100 if self.trades else 0.0),
+            "pnl_total": r(self.gross_profit + self.gross_loss),
+            "gross_profit": r(self.gross_profit),
+            "gross_loss": r(self.gross_loss),
+            "profit_factor": r(self.gross_profit / -self.gross_loss) if self.gross_loss < 0 else None,
+            "expectancy": r((self.gross_profit + self.gross_loss) / self.trades if self.trades else 0.0),
+            "avg_win": r(self.gross_profit / self.wins if self.wins else 0.0),
+            "avg_loss": r(self.gross_loss / self.losses if self.losses else 0.0),
+            "longest_win_streak": self.longest_win_streak,
+            "longest_loss_streak": self.longest_loss_streak,
+            "current_streak": self.streak,
+            "max_consecutive_loss": r(self.max_consecutive_loss),
+            "trading_days": n_days,
+            "sharpe_daily": r(sharpe, 3),
+            "sortino_daily": r(sortino, 3),
+            "sharpe_annualized": r(sharpe * annual if sharpe is not None else None),
+            "sortino_annualized": r(sortino * annual if sortino is not None else None),
+        }
+
+
+class AnalyticsEngine:
+    """
+    Tableaux numpy alignés (un par colonne) des deals de trading, triés par
+    (time_ms, rowid) : une fenêtre de dates est une simple tranche (vue).
+    - refresh() : ajoute les lignes de rowid > dernier rowid chargé (appelé
+      après chaque sync, et à la lecture si la génération a changé) ; un
+      ajout antérieur au dernier deal (backfill, réparation) re-trie
+    - capacité doublée à l'ajout ; l'état publié (colonnes, n) est remplacé
+      d'un bloc : les lectures ne prennent pas de verrou
+    - métriques de performance "depuis le début" (global + par compte)
+      tenues à jour à chaque ajout ; seules les séries d'une clé qui reçoit
+      un deal antérieur à son dernier deal compté sont recalculées (à la lecture)
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self) -> None:
+        # (colonnes, nombre de lignes valides) : toujours lus ensemble
+        self._view: Tuple[Dict[str, np.ndarray], int] = (
+            {name: np.empty(0, dtype) for name, dtype in COLUMNS}, 0
+        )
+        self._last_rowid = 0
+        self._generation: Optional[int] = None
+        self._rewrite_generation: Optional[int] = None
+        self.symbols = _Codes()
+        self.accounts = _Codes()
+        self.types = _Codes()
+        self.entry_types = _Codes()
+        # code compte (None = tous) → métriques ; séries invalidées : recalcul à la lecture
+        self._metrics: Dict[Optional[int], PerformanceMetrics] = {}
+
+    # ---------- chargement ----------
+    def refresh(self) -> int:
+        """Met la copie à jour ; retourne le nombre de lignes ajoutées."""
+        generation = db.get_data_generation()
+        if generation == self._generation:
+            return 0
+
+        with self._lock:
+            if generation == self._generation:
+                return 0
+            rewrite = db.get_rewrite_generation()
+            if rewrite != self._rewrite_generation:
+                if self._rewrite_generation is not None:
+                    logger.info("🔄 Deals réécrits → rechargement complet du moteur analytics")
+                self._reset()
+                self._rewrite_generation = rewrite
+
+            t0 = time.perf_counter()
+            added = self._append_new_rows()
+            self._generation = generation
+
+        if added:
+            logger.info(
+                f"📊 Moteur analytics : +{added} deals ({self.size} en mémoire) "
+                f"en {(time.perf_counter() - t0) * 1000:.0f} ms"
+            )
+        return added
+
+    def _append_new_rows(self) -> int:
+        added = 0
+        with db.read_snapshot() as conn:
+            cur = conn.cursor()
+            cur.row_factory = None  # tuples bruts : pas d'objet Row par ligne
+            cur.execute(_LOAD_SQL, [self._last_rowid])
+            while True:
+                batch = cur.fetchmany(ENGINE_LOAD_CHUNK)
+                if not batch:
+                    break
+                self._append_batch(batch)
+                added += len(batch)
+        return added
+
+    def _append_batch(self, batch: List[tuple]) -> None:
+        (rowids, time_ms, profit, commission, swap, volume,
+         symbols, accounts, types, entry_types) = zip(*batch)
+        k = len(batch)
+        values = {
+            "time_ms": np.fromiter(time_ms, np.int64, k),
+            "profit": np.fromiter(profit, np.float64, k),
+            "commission": np.array(commission, dtype=np.float64),  # None → nan
+            "swap": np.array(swap, dtype=np.float64),
+            "volume": np.array(volume, dtype=np.float64),
+            "symbol": np.fromiter(map(self.symbols.code, symbols), np.int32, k),
+            "account": np.fromiter(map(self.accounts.code, accounts), np.int32, k),
+            "type": np.fromiter(map(self.types.code, types), np.int32, k),
+            "entry_type": np.fromiter(map(self.entry_types.code, entry_types), np.int32, k),
+        }
+
+        cols, n = self._view
+        times = values["time_ms"]
+        in_order = bool(np.all(times[1:] >= times[:-1])) and (n == 0 or times[0] >= cols["time_ms"][n - 1])
+
+        if in_order:
+            # cas courant (sync incrémentale) : ajout en place après les n lignes publiées
+            if n + k > len(cols["time_ms"]):
+                capacity = max(n + k, 2 * len(cols["time_ms"]), 1024)
+                grown = {}
+                for name, dtype in COLUMNS:
+                    grown[name] = np.empty(capacity, dtype)
+                    grown[name][:n] = cols[name][:n]
+                cols = grown
+            for name, _ in COLUMNS:
+                cols[name][n:n + k] = values[name]
+        else:
+            # deals plus anciens que le dernier chargé : fusion + tri stable (nouveaux tableaux)
+            merged = {name: np.concatenate([cols[name][:n], values[name]]) for name, _ in COLUMNS}
+            order = np.argsort(merged["time_ms"], kind="stable")
+            cols = {name: col[order] for name, col in merged.items()}
+
+        self._view = (cols, n + k)
+        self._last_rowid = rowids[-1]
+        self._update_metrics(values)
+
+    # ---------- lecture ----------
+    @property
+    def loaded(self) -> bool:
+        """Copie construite (premier refresh fait, à la première lecture) ?"""
+        return self._generation is not None
+
+    @property
+    def size(self) -> int:
+        return self._view[1]
+
+    def columns(self) -> Dict[str, np.ndarray]:
+        """Vues [:n] de toutes les colonnes (cohérentes entre elles), triées par temps."""
+        self.refresh()
+        cols, n = self._view
+        return {name: cols[name][:n] for name, _ in COLUMNS}
+
+    def select(
+        self,
+        fields: Tuple[str, ...],
+        days: Optional[int] = None,
+        symbol: Optional[str] = None,
+        account: Optional[str] = None,
+    ) -> Dict[str, np.ndarray]:
+        """Colonnes `fields` filtrées : fenêtre "derniers `days` jours", symbole, compte."""
+        cols = self.columns()
+        start = 0
+        if days is not None:
+            # colonnes triées par temps : la fenêtre est une tranche (recherche binaire)
+            start_ms = db.window_start_ms(days)
+            start = int(np.searchsorted(cols["time_ms"], start_ms, side="left"))
+
+        mask = None
+        if symbol:
+            mask = cols["symbol"][start:] == self.symbols.lookup(symbol.upper())
+        if account:
+            by_account = cols["account"][start:] == self.accounts.lookup(account)
+            mask = by_account if mask is None else mask & by_account
+        if mask is None:
+            return {name: cols[name][start:] for name in fields}
+        return {name: cols[name][start:][mask] for name in fields}
+
+    def exit_mask(self, entry_type: np.ndarray) -> np.ndarray:
+        """Sorties : DEAL_ENTRY_OUT, ou entry_type absent (comme les rollups)."""
+        is_exit = np.zeros(len(self.entry_types) + 1, dtype=bool)  # +1 : code -1 (absent)
+        is_exit[[self.entry_types.lookup("DEAL_ENTRY_OUT"), self.entry_types.lookup(None)]] = True
+        is_exit[-1] = False
+        return is_exit[entry_type]
+
+    # ---------- métriques de performance ----------
+    def _exits(self, cols: Dict[str, np.ndarray], account_code: Optional[int] = None):
+        """(temps, profits, comptes) des sorties de `cols`, triées par temps."""
+        keep = self.exit_mask(cols["entry_type"])
+        if account_code is not None:
+            keep &= cols["account"] == account_code
+        order = np.argsort(cols["time_ms"][keep], kind="stable")
+        return cols["time_ms"][keep][order], cols["profit"][keep][order], cols["account"][keep][order]
+
+    def _update_metrics(self, batch: Dict[str, np.ndarray]) -> None:
+        """Ajoute les sorties d'un lot (global + par compte)."""
+        times, profits, accounts = self._exits(batch)
+        if not len(times):
+            return
+        groups = [(None, slice(None))]
+        groups += [(code, accounts == code) for code in np.unique(accounts).tolist()]
+        for key, sel in groups:
+            acc = self._metrics.setdefault(key, PerformanceMetrics())
+            t = times[sel]
+            if t[0] < acc.last_ms:
+                # deal antérieur (backfill, comptes synchronisés en alternance) :
+                # seules les séries, qui dépendent de l'ordre, sont à recalculer
+                acc.add_unordered(t, profits[sel])
+            else:
+                acc.add_many(t, profits[sel])
+
+    def metrics(self, account: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Métriques depuis le début (tous comptes ou un compte), sans recalcul
+        si à jour. Séries invalidées : recalculées (numpy) sur la fusion triée
+        par temps des colonnes publiées, HORS verrou — refresh() n'attend pas.
+        """
+        self.refresh()
+        key = self.accounts.lookup(account) if account else None
+        if account and key < 0:
+            return PerformanceMetrics().to_dict()
+        while True:
+            with self._lock:
+                acc = self._metrics.get(key)
+                if acc is None:
+                    return PerformanceMetrics().to_dict()
+                if not acc.sequence_stale:
+                    return acc.to_dict()
+                version, (cols, n) = acc.version, self._view
+
+            _, profits, _ = self._exits({name: cols[name][:n] for name, _ in COLUMNS}, key)
+
+            with self._lock:
+                # pas de lot appliqué entre-temps : la vue lue correspond aux totaux
+                if self._metrics.get(key) is acc and acc.version == version:
+                    acc.set_sequence(profits)
+                    return acc.to_dict()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "deals": self.size,
+            "symbols": len(self.symbols),
+            "accounts": len(self.accounts),
+            "last_rowid": self._last_rowid,
+            "generation": self._generation,
+            "bytes": int(sum(col.nbytes for col in self._view[0].values())),
+        }
+
+
+ENGINE = AnalyticsEngine()
+
+
+# ---------------------------------------------------------------------------
+# AGRÉGATS VECTORISÉS
+# ---------------------------------------------------------------------------
+def _group_sum(keys: np.ndarray, weights: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    (clés entières présentes, triées ; somme des poids par clé) en O(n) :
+    bincount sur clé - min (jours : plage dense), sans tri.
+    """
+    if not len(keys):
+        return keys, weights
+    base = keys.min()
+    offsets = keys - base
+    present = np.flatnonzero(np.bincount(offsets))
+    sums = np.bincount(offsets, weights=weights)
+    return present + base, sums[present]
+
+
+def _daily(cols: Dict[str, np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    """(numéros de jour UTC, PNL du jour) des jours ayant au moins un deal."""
+    return _group_sum(cols["time_ms"] // MS_PER_DAY, cols["profit"])
+
+
+def _day_labels(day_numbers: np.ndarray) -> List[str]:
+    return day_numbers.astype("datetime64[D]").astype(str).tolist()
+
+
+def drawdown_pct(equity: np.ndarray) -> np.ndarray:
+    """
+    Drawdown % par rapport au plus haut précédent (plus haut initial : 0,
+    drawdown nul tant qu'aucun gain n'a été fait), comme _drawdown_from_daily.
+    """
+    peak = np.maximum.accumulate(np.maximum(equity, 0.0)) if len(equity) else equity
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(peak > 0, (equity - peak) / peak * 100.0, 0.0)
+
+
+def _scope(days: int, symbol: Optional[str], account: Optional[str]) -> Dict[str, Any]:
+    return {
+        "period_days": days,
+        "symbol_filter": symbol.upper() if symbol else None,
+        "account_filter": account,
+    }
+
+
+# ---------------------------------------------------------------------------
+# PANNEAUX (même format que dashboard_db.*_from_db)
+# ---------------------------------------------------------------------------
+@db.cached_by_generation
+def summary(days: int = 30, symbol: Optional[str] = None, account: Optional[str] = None) -> Dict[str, Any]:
+    cols = ENGINE.select(("symbol", "profit", "entry_type"), days=days, account=account)
+    n_symbols = len(ENGINE.symbols)
+    codes = cols["symbol"]
+    profit = cols["profit"]
+    is_exit = ENGINE.exit_mask(cols["entry_type"])
+
+    nb = np.bincount(codes, minlength=n_symbols)
+    pnl = np.bincount(codes, weights=profit, minlength=n_symbols)
+    wins = np.bincount(codes[is_exit & (profit > 0)], minlength=n_symbols)
+    losses = np.bincount(codes[is_exit & (profit <= 0)], minlength=n_symbols)
+
+    if symbol:
+        code = ENGINE.symbols.lookup(symbol.upper())
+        picked = [code] if code >= 0 else []
+    else:
+        picked = slice(None)
+    nb_deals = int(nb[picked].sum())
+    pnl_sum = float(pnl[picked].sum())
+    total_wins = int(wins[picked].sum())
+    total_losses = int(losses[picked].sum())
+    total_closed = total_wins + total_losses
+
+    # top global du compte (sans filtre symbole)
+    ranked = [c for c in np.argsort(-pnl, kind="stable") if nb[c] and ENGINE.symbols.values[c]]
+    top_symbols = [
+        {"symbol": ENGINE.symbols.values[c], "nb_deals": int(nb[c]), "pnl": round(float(pnl[c]), 2)}
+        for c in ranked[:5]
+    ]
+
+    return {
+        **_scope(days, symbol, account),
+        "nb_deals": nb_deals,
+        "pnl_total": round(pnl_sum, 2),
+        "avg_profit": round(pnl_sum / nb_deals, 2) if nb_deals else 0,
+        "wins": total_wins,
+        "losses": total_losses,
+        "winrate": round(total_wins / total_closed * 100, 2) if total_closed > 0 else 0,
+        "top_symbols": top_symbols,
+    }
+
+
+@db.cached_by_generation
+def pnl_by_day(days: int = 30, symbol: Optional[str] = None, account: Optional[str] = None) -> List[Dict[str, Any]]:
+    cols = ENGINE.select(("time_ms", "profit"), days=days, symbol=symbol, account=account)
+    day_numbers, pnl = _daily(cols)
+    return [
+        {"day": day, "pnl": value}
+        for day, value in zip(_day_labels(day_numbers), np.round(pnl, 2).tolist())
+    ]
+
+
+@db.cached_by_generation
+def drawdown(days: int = 30, symbol: Optional[str] = None, account: Optional[str] = None) -> Dict[str, Any]:
+    daily = pnl_by_day.__wrapped__(days=days, symbol=symbol, account=account)
+    return _drawdown_from_daily(daily, days, symbol, account)
+
+
+def _drawdown_from_daily(
+    daily: List[Dict[str, Any]], days: int, symbol: Optional[str], account: Optional[str]
+) -> Dict[str, Any]:
+    equity = np.cumsum(np.fromiter((d["pnl"] for d in daily), np.float64, len(daily)))
+    dd = drawdown_pct(equity)
+    return {
+        **_scope(days, symbol, account),
+        "items": [
+            {"day": d["day"], "equity": e, "drawdown": x}
+            for d, e, x in zip(daily, np.round(equity, 2).tolist(), np.round(dd, 2).tolist())
+        ],
+        "max_drawdown": round(min(0.0, float(dd.min())) if len(dd) else 0.0, 2),
+    }
+
+
+@db.cached_by_generation
+def monthly_performance(days: int = 180, symbol: Optional[str] = None, account: Optional[str] = None) -> Dict[str, Any]:
+    cols = ENGINE.select(("time_ms", "profit"), days=days, symbol=symbol, account=account)
+    # jours d'abord (O(n), sans tri), puis jours → mois (quelques centaines de valeurs)
+    day_numbers, day_pnl = _daily(cols)
+    months = day_numbers.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+    uniq, pnl = _group_sum(months, day_pnl)
+    uniq = uniq.astype("datetime64[M]")
+    return {
+        **_scope(days, symbol, account),
+        "items": [
+            {"month": month, "pnl": value}
+            for month, value in zip(uniq.astype(str).tolist(), np.round(pnl, 2).tolist())
+        ],
+    }
+
+
+@db.cached_by_generation
+def symbol_stats(days: int = 90, symbol: Optional[str] = None, account: Optional[str] = None) -> Dict[str, Any]:
+    cols = ENGINE.select(("symbol", "profit"), days=days, symbol=symbol, account=account)
+    n_symbols = len(ENGINE.symbols)
+    codes = cols["symbol"]
+    profit = cols["profit"]
+
+    trades = np.bincount(codes, minlength=n_symbols)
+    pnl = np.bincount(codes, weights=profit, minlength=n_symbols)
+    wins = np.bincount(codes[profit > 0], minlength=n_symbols)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        winrate = np.where(trades > 0, wins / trades * 100.0, 0.0)
+
+    items = [
+        {
+            "symbol": ENGINE.symbols.values[c],
+            "trades": int(trades[c]),
+            "pnl": round(float(pnl[c]), 2),
+            "winrate": round(float(winrate[c]), 2),
+        }
+        for c in np.argsort(-pnl, kind="stable")
+        if trades[c] and ENGINE.symbols.values[c]
+    ]
+    return {**_scope(days, symbol, account), "items": items}
+
+
+@db.cached_by_generation
+def dashboard(
+    days: int = 30,
+    symbol: Optional[str] = None,
+    account: Optional[str] = None,
+    deals_limit: int = 100,
+) -> Dict[str, Any]:
+    """Équivalent de dashboard_from_db ; seuls les derniers deals viennent de SQLite."""
+    daily = pnl_by_day.__wrapped__(days=days, symbol=symbol, account=account)
+    return {
+        **_scope(days, symbol, account),
+        "summary": summary.__wrapped__(days=days, symbol=symbol, account=account),
+        "pnl_by_day": daily,
+        "drawdown": _drawdown_from_daily(daily, days, symbol, account),
+        "monthly_performance": monthly_performance.__wrapped__(days=days, symbol=symbol, account=account),
+        "symbol_stats": symbol_stats.__wrapped__(days=days, symbol=symbol, account=account),
+        "deals": db.list_deals_from_db(days=days, symbol=symbol, limit=deals_limit, account=account),
+    }
+
+
+# ---------------------------------------------------------------------------
+# COURBE EQUITY / DRAWDOWN AU DEAL PRÈS (+ SOUS-ÉCHANTILLONNAGE LTTB)
+# ---------------------------------------------------------------------------
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets : indices de `threshold` points qui
+    conservent la forme visuelle de la série (premier et dernier inclus).
+    Une itération Python par bucket (≤ threshold), vectorisée dans le bucket.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    xf = x.astype(np.float64)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)  # buckets des points 1..n-2
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # moyenne du bucket suivant (dernier point pour le dernier bucket)
+        nlo, nhi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = xf[nlo:nhi].mean()
+        avg_y = y[nlo:nhi].mean()
+        # aire du triangle (a, point candidat, moyenne suivante)
+        area = np.abs(
+            (xf[a] - avg_x) * (y[lo:hi] - y[a]) - (xf[a] - xf[lo:hi]) * (avg_y - y[a])
+        )
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    selected[-1] = n - 1
+    return selected
+
+
+def _underwater_stats(times: np.ndarray, equity: np.ndarray) -> Dict[str, Any]:
+    """
+    Plus haut courant (initial : 0), drawdown, et épisodes sous l'eau en O(n) :
+    - durée max sous l'eau : plus haut → retour au plus haut (ou dernier deal
+      si l'épisode est en cours)
+    - épisode du drawdown max (en valeur) : plus haut, creux, récupération
+    """
+    n = len(equity)
+    idx = np.arange(n)
+    peak = np.maximum.accumulate(np.maximum(equity, 0.0))
+    dd_abs = equity - peak
+    is_high = dd_abs >= 0
+
+    # dernier plus haut à gauche (-1 : pas encore de plus haut → début de la série)
+    last_high = np.maximum.accumulate(np.where(is_high, idx, -1))
+    peak_time = np.where(last_high >= 0, times[np.maximum(last_high, 0)], times[0])
+    # prochain plus haut à droite (n : jamais récupéré)
+    next_high = np.minimum.accumulate(np.where(is_high, idx, n)[::-1])[::-1]
+    end_time = np.where(next_high < n, times[np.minimum(next_high, n - 1)], times[-1])
+
+    underwater = ~is_high
+    longest_ms = int((end_time - peak_time)[underwater].max()) if underwater.any() else 0
+
+    trough = int(np.argmin(dd_abs))
+    episode = None
+    if dd_abs[trough] < 0:
+        recovered = next_high[trough] < n
+        episode = {
+            "peak_time": db.iso_from_ms(int(peak_time[trough])),
+            "trough_time": db.iso_from_ms(int(times[trough])),
+            "recovery_time": db.iso_from_ms(int(end_time[trough])) if recovered else None,
+            "drawdown": round(float(dd_abs[trough]), 2),
+            "duration_days": round(float(end_time[trough] - peak_time[trough]) / MS_PER_DAY, 2),
+            "recovery_days": (
+                round(float(end_time[trough] - times[trough]) / MS_PER_DAY, 2) if recovered else None
+            ),
+        }
+
+    return {
+        "peak": peak,
+        "drawdown_abs": dd_abs,
+        "trough": trough,
+        "max_drawdown_duration_days": round(longest_ms / MS_PER_DAY, 2),
+        "max_drawdown_episode": episode,
+    }
+
+
+@db.cached_by_generation
+def equity_curve(
+    days: int = 30,
+    symbol: Optional[str] = None,
+    account: Optional[str] = None,
+    points: int = 1000,
+) -> Dict[str, Any]:
+    """
+    Equity cumulée et drawdown après chaque deal (pas de regroupement par
+    jour UTC : les drawdowns intrajournaliers sont visibles), calculés en
+    passes O(n) sur les colonnes triées par temps, puis ramenés à `points`
+    points par LTTB (le creux du drawdown max est toujours conservé).
+    """
+    cols = ENGINE.select(("time_ms", "profit"), days=days, symbol=symbol, account=account)
+    times = cols["time_ms"]
+    n = len(times)
+    base = {
+        **_scope(days, symbol, account),
+        "deals": n,
+        "points": 0,
+        "items": [],
+        "max_drawdown": 0.0,
+        "max_drawdown_abs": 0.0,
+        "max_drawdown_duration_days": 0.0,
+        "max_drawdown_episode": None,
+    }
+    if not n:
+        return base
+
+    equity = np.cumsum(cols["profit"])
+    uw = _underwater_stats(times, equity)
+    dd_pct = drawdown_pct(equity)
+
+    keep = lttb(times, equity, points)
+    if uw["trough"] not in keep:
+        keep = np.sort(np.append(keep, uw["trough"]))
+
+    labels = [db.iso_from_ms(t) for t in times[keep].tolist()]
+    items = [
+        {"time": t, "equity": e, "drawdown": p, "drawdown_abs": a}
+        for t, e, p, a in zip(
+            labels,
+            np.round(equity[keep], 2).tolist(),
+            np.round(dd_pct[keep], 2).tolist(),
+            np.round(uw["drawdown_abs"][keep], 2).tolist(),
+        )
+    ]
+
+    return {
+        **base,
+        "points": len(items),
+        "items": items,
+        "max_drawdown": round(min(0.0, float(dd_pct.min())), 2),
+        "max_drawdown_abs": round(min(0.0, float(uw["drawdown_abs"].min())), 2),
+        "max_drawdown_duration_days": uw["max_drawdown_duration_days"],
+        "max_drawdown_episode": uw["max_drawdown_episode"],
+    }
+
+
+# ---------------------------------------------------------------------------
+# MÉTRIQUES DE PERFORMANCE AVANCÉES
+# ---------------------------------------------------------------------------
+@db.cached_by_generation
+def performance_metrics(
+    days: Optional[int] = None,
+    symbol: Optional[str] = None,
+    account: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Profit factor, espérance, gain / perte moyens, séries, perte consécutive
+    max, Sharpe / Sortino journaliers.
+    - sans `days` ni `symbol` : compteurs incrémentaux du moteur (O(1))
+    - sinon : recalcul sur la fenêtre / le symbole (une passe)
+    """
+    if days is None and not symbol:
+        metrics = ENGINE.metrics(account)
+    else:
+        cols = ENGINE.select(("time_ms", "profit", "entry_type"), days=days, symbol=symbol, account=account)
+        exits = ENGINE.exit_mask(cols["entry_type"])
+        acc = PerformanceMetrics()
+        acc.add_many(cols["time_ms"][exits], cols["profit"][exits])  # colonnes déjà triées
+        metrics = acc.to_dict()
+    return {**_scope(days, symbol, account), **metrics}
@@ -1,38 +1,115 @@
 # app.py
 import os
+import json
+import time
+import hashlib
 import logging
 import asyncio
+from email.utils import formatdate, parsedate_to_datetime
 from typing import Optional, Dict, Any, List
 from datetime import datetime, timedelta
 
 from fastapi import FastAPI, Request, Query, HTTPException
-from fastapi.responses import FileResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 from telegram import Bot, Update
 from telegram.ext import Dispatcher
 
 from metaapi_client import MetaApiClient
-from config import API_KEY, ACCOUNT_ID, TOKEN, APP_URL
+from config import API_KEY, ACCOUNT_IDS, TOKEN, APP_URL
 
 import mt_bot                  # ton bot existant
 import dashboard_db as db      # module DB/analytics
-from history_sync import full_sync_history, incremental_sync_history
+import analytics_engine        # copie colonnaire en mémoire (numpy), construite à la demande
+import deal_archive            # archive brute des deals (replay sans réseau)
+from live_positions import PositionsHub
+from history_sync import (
+    get_scheduler,
+    get_wakeup,
+    is_backfill_done,
+    request_sync,
+    AdaptivePollInterval,
+    SYNC_EVENT_DEBOUNCE_SECONDS,
+    RECONCILE_INTERVAL_SECONDS,
+)
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# --- MetaApi RPC client ---
-META = MetaApiClient(api_key=API_KEY, account_id=ACCOUNT_ID)
+# --- MetaApi : un client par compte (RPC + streaming pour les événements) ---
+# Tous dans ce process : chaque client a sa boucle asyncio dans son thread.
+METAAPI_STREAMING = os.getenv("METAAPI_STREAMING", "1") not in ("0", "false", "False")
+# durée de vie du cache des positions ouvertes (partagé par tous les appelants)
+OPEN_POSITIONS_TTL_SECONDS = float(os.getenv("OPEN_POSITIONS_TTL_SECONDS", "1"))
+METAS: Dict[str, MetaApiClient] = {
+    account_id: MetaApiClient(
+        api_key=API_KEY,
+        account_id=account_id,
+        streaming=METAAPI_STREAMING,
+        positions_ttl=OPEN_POSITIONS_TTL_SECONDS,
+    )
+    for account_id in ACCOUNT_IDS
+}
+
+# Événements streaming qui déclenchent une sync incrémentale
+SYNC_TRIGGER_EVENTS = {"deal_added", "position_removed"}
+
+
+def _event_handler(account_id: str):
+    def on_meta_event(kind: str, payload: Any) -> None:
+        # appelé sur la boucle MetaApi : on réveille la tâche de sync du compte
+        # et on relaie les positions au hub live (thread-safe, non bloquant)
+        if kind in SYNC_TRIGGER_EVENTS:
+            request_sync(kind, account_id)
+        if kind == "position_updated":
+            LIVE.publish_update(_format_position(payload, account_id))
+        elif kind == "position_removed":
+            LIVE.publish_removed(account_id, payload)
+    return on_meta_event
 
-# Intervalle de sync incrémentale en secondes
-INCREMENTAL_SYNC_INTERVAL = int(os.getenv("INCREMENTAL_SYNC_INTERVAL", "60"))
+
+for _account_id, _client in METAS.items():
+    _client.add_event_handler(_event_handler(_account_id))
+    get_wakeup(_account_id)  # compte connu de request_sync dès l'import
+
+
+def _get_client(account: Optional[str]) -> MetaApiClient:
+    client = METAS.get(account)
+    if client is None:
+        raise HTTPException(status_code=404, detail=f"Compte inconnu: {account}")
+    return client
 
 # URL publique de l'app (Railway / ngrok) pour le webhook Telegram
 #APP_URL = os.getenv("APP_URL", "").strip()
 
+# --- Sérialisation JSON : orjson si disponible (plusieurs fois plus rapide) ---
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+        return json.dumps(content, separators=(",", ":"), ensure_ascii=False, default=str).encode()
+
+
+# Réponses compressées au-delà de ce seuil (octets) ; le flux SSE est exclu par Starlette
+GZIP_MIN_SIZE = int(os.getenv("GZIP_MIN_SIZE", "1024"))
+
 # --- FastAPI app ---
-app = FastAPI(title="Aiteck Bot + Dashboard", version="1.0.0")
+app = FastAPI(
+    title="Aiteck Bot + Dashboard",
+    version="1.0.0",
+    default_response_class=FastJSONResponse,
+)
+app.add_middleware(GZipMiddleware, minimum_size=GZIP_MIN_SIZE)
 app.mount("/dashboard", StaticFiles(directory="dashboard"), name="dashboard")
 
 # --- Telegram ---
@@ -42,33 +119,81 @@ mt_bot.setup_dispatcher(dispatcher)   # on branche tous les handlers existants
 
 
 # ---------------------------------------------------------------------------
-# TÂCHE BACKGROUND : SYNC INCRÉMENTALE PÉRIODIQUE
+# TÂCHE BACKGROUND : SYNC INCRÉMENTALE (ÉVÉNEMENTS + POLLING DE SECOURS)
 # ---------------------------------------------------------------------------
-async def incremental_sync_worker():
+async def incremental_sync_worker(meta: MetaApiClient):
     """
-    Tâche périodique en arrière-plan :
-    - appelle incremental_sync_history(META)
-    - attend INCREMENTAL_SYNC_INTERVAL secondes
-    - recommence en boucle
+    Tâche en arrière-plan (une par compte, toutes concurrentes) :
+    - lance la sync incrémentale du compte (sur la boucle de son client MetaApi)
+    - attend un réveil (deal/position streaming, ordre passé via le bot)
+      ou, à défaut, l'intervalle de polling adaptatif
+    - l'intervalle revient au minimum dès qu'il y a de l'activité et
+      double à chaque sync vide (jusqu'à INCREMENTAL_SYNC_MAX_INTERVAL)
     """
+    account_id = meta.account_id
+    wakeup = get_wakeup(account_id)
+    wakeup.attach()
+    scheduler = get_scheduler(meta)
+    interval = AdaptivePollInterval()
     logger.info(
-        f"🚀 Tâche de sync incrémentale démarrée "
-        f"(toutes les {INCREMENTAL_SYNC_INTERVAL}s)"
+        f"🚀 [{account_id}] Tâche de sync incrémentale démarrée "
+        f"(événements + polling {interval.min_s:.0f}s → {interval.max_s:.0f}s)"
     )
 
     while True:
+        inserted = 0
         try:
-            if not META._connected:
-                logger.warning("⏳ MetaApi non connecté, skip de la sync incrémentale.")
+            if not meta._connected:
+                logger.warning(f"⏳ [{account_id}] MetaApi non connecté, skip de la sync incrémentale.")
             else:
-                logger.info("⏱ Lancement incremental_sync_history()")
-                # on déplace le travail lourd dans un thread pour ne pas bloquer l'event loop
-                await asyncio.to_thread(incremental_sync_history, META)
-                logger.info("✅ incremental_sync_history() terminé")
+                logger.info(f"⏱ [{account_id}] Lancement de la sync incrémentale")
+                # exécutée sur la boucle MetaApi du compte, on attend juste son Future
+                # (backfill repris automatiquement s'il n'est pas terminé)
+                inserted = await scheduler.incremental_sync() or 0
+                logger.info(f"✅ [{account_id}] Sync incrémentale terminée")
+                if inserted and analytics_engine.ENGINE.loaded:
+                    # copie en mémoire déjà construite : ajout des nouveaux deals
+                    # (par rowid) + mise à jour incrémentale des métriques
+                    await asyncio.to_thread(analytics_engine.ENGINE.refresh)
+        except Exception as e:
+            logger.error(f"❌ [{account_id}] Erreur dans la sync incrémentale: {e}")
+
+        delay = interval.on_activity() if inserted else interval.on_idle()
+
+        reasons = await wakeup.wait(delay)
+        if reasons:
+            interval.on_activity()
+            # un ordre génère plusieurs événements en rafale : on les regroupe
+            await asyncio.sleep(SYNC_EVENT_DEBOUNCE_SECONDS)
+            reasons += await wakeup.wait(0)
+            logger.info(f"🔔 [{account_id}] Sync déclenchée par : {', '.join(sorted(set(reasons)))}")
+
+
+# ---------------------------------------------------------------------------
+# TÂCHE BACKGROUND : RÉCONCILIATION (DÉTECTION + RÉPARATION DES TROUS)
+# ---------------------------------------------------------------------------
+# dernier rapport par compte (exposé par /api/accounts)
+LAST_RECONCILE: Dict[str, Dict[str, Any]] = {}
+
+
+async def reconcile_worker(meta: MetaApiClient):
+    """
+    Toutes les RECONCILE_INTERVAL_SECONDS : compare les empreintes
+    journalières DB ↔ MetaApi sur l'horizon glissant et ne refait que les
+    jours en écart. Passe par le même ordonnanceur que les syncs (sérialisé).
+    """
+    account_id = meta.account_id
+    scheduler = get_scheduler(meta)
+
+    while True:
+        try:
+            if meta._connected:
+                report = await scheduler.reconcile()
+                LAST_RECONCILE[account_id] = {**report, "at": datetime.utcnow().isoformat() + "Z"}
         except Exception as e:
-            logger.error(f"❌ Erreur dans incremental_sync_history(): {e}")
+            logger.error(f"❌ [{account_id}] Erreur dans la réconciliation: {e}")
 
-        await asyncio.sleep(INCREMENTAL_SYNC_INTERVAL)
+        await asyncio.sleep(RECONCILE_INTERVAL_SECONDS)
 
 
 # ---------------------------------------------------------------------------
@@ -79,35 +204,65 @@ async def on_startup():
     # 1) Init DB + index
     db.init_db()
 
-    # 2) Connexion MetaApi RPC
-    META.connect_threaded()
+    # 1b) Archive : deals déjà en DB archivés une fois par compte (base du replay)
+    for account_id in METAS:
+        try:
+            await asyncio.to_thread(deal_archive.ensure_baseline, account_id)
+        except Exception as e:
+            logger.error(f"❌ [{account_id}] Base de l'archive non écrite: {e}")
 
-    # 3) Attendre la connexion RPC (petit retry)
+    # 2) Connexion MetaApi RPC (tous les comptes en parallèle)
+    for meta in METAS.values():
+        meta.connect_threaded()
+
+    # 3) Attendre les connexions RPC (petit retry)
     for _ in range(25):
-        if META._connected:
+        if all(meta._connected for meta in METAS.values()):
             break
         await asyncio.sleep(0.5)
 
-    if not META._connected:
-        logger.error("❌ MetaApi RPC n’a pas pu se connecter.")
-        return
-
-    # 4) FULL SYNC si DB vide, sinon on ne fait rien (on laisse l'incrémentale bosser)
-    conn = db.get_db_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT COUNT(*) as c FROM deals")
-    count = cur.fetchone()["c"]
-    conn.close()
-
-    if count == 0:
-        logger.info("Aucune donnée locale → FULL SYNC")
-        # full_sync_history peut être lourd → on le lance dans un thread
-        await asyncio.to_thread(full_sync_history, META)
+    connected = [meta for meta in METAS.values() if meta._connected]
+    for account_id, meta in METAS.items():
+        if not meta._connected:
+            logger.error(
+                f"❌ [{account_id}] MetaApi RPC n’a pas pu se connecter "
+                f"(nouvelles tentatives en arrière-plan, sync reprise à la connexion)."
+            )
+
+    # 4) FULL SYNC des comptes dont le backfill n'est pas terminé (DB vide ou
+    #    backfill interrompu : il reprend au dernier checkpoint), en parallèle.
+    #    Chaque backfill tourne sur la boucle de son client : la boucle FastAPI reste libre
+    pending = [meta for meta in connected if not is_backfill_done(meta.account_id)]
+    if pending:
+        logger.info(
+            f"Backfill incomplet → FULL SYNC (reprise au checkpoint) : "
+            f"{', '.join(meta.account_id for meta in pending)}"
+        )
+        results = await asyncio.gather(
+            *(get_scheduler(meta).full_sync() for meta in pending), return_exceptions=True
+        )
+        for meta, result in zip(pending, results):
+            if isinstance(result, Exception):
+                logger.error(f"❌ [{meta.account_id}] FULL SYNC interrompu: {result}")
     else:
-        logger.info("Données déjà présentes → pas de FULL SYNC")
-
-    # 5) Démarrer la tâche de sync incrémentale en arrière-plan
-    app.state.sync_task = asyncio.create_task(incremental_sync_worker())
+        logger.info("Backfill déjà terminé → pas de FULL SYNC")
+
+    # 4b) Moteur analytics en mémoire : préchargé seulement si ANALYTICS_ENGINE=memory
+    #     (panneaux) ; sinon construit à la première lecture de /api/equity-curve
+    #     ou /api/metrics
+    if ANALYTICS_ENGINE == "memory":
+        await asyncio.to_thread(analytics_engine.ENGINE.refresh)
+
+    # 5) Démarrer une tâche de sync incrémentale par compte en arrière-plan
+    app.state.sync_tasks = [
+        asyncio.create_task(incremental_sync_worker(meta)) for meta in METAS.values()
+    ]
+    # 5b) Réconciliation périodique par compte (filet de sécurité des syncs)
+    app.state.sync_tasks += [
+        asyncio.create_task(reconcile_worker(meta)) for meta in METAS.values()
+    ]
+    # 5c) Producteur unique des positions live (flux SSE du dashboard)
+    app.state.sync_tasks.append(asyncio.create_task(LIVE.run()))
 
     # 6) (optionnel) Setup automatique du webhook Telegram si APP_URL est configuré
     if APP_URL:
@@ -126,13 +281,14 @@ async def on_shutdown():
     """
     On arrête proprement la tâche background quand l'app se ferme.
     """
-    task = getattr(app.state, "sync_task", None)
-    if task:
+    tasks = getattr(app.state, "sync_tasks", [])
+    for task in tasks:
         task.cancel()
-        try:
-            await task
-        except asyncio.CancelledError:
-            logger.info("🔚 Tâche de sync incrémentale arrêtée proprement.")
+    if tasks:
+        await asyncio.gather(*tasks, return_exceptions=True)
+        logger.info("🔚 Tâches de sync / réconciliation / positions live arrêtées proprement.")
+
+    db.close_all_connections()
 
 
 # ---------------------------------------------------------------------------
@@ -190,6 +346,141 @@ def dashboard_page():
     return FileResponse("dashboard/index.html")
 
 
+# ---------------------------------------------------------------------------
+# GET CONDITIONNEL (ETag / Last-Modified) POUR LES ENDPOINTS ADOSSÉS À LA DB
+# ---------------------------------------------------------------------------
+# Réponses qui ne dépendent que de la DB (+ paramètres + jour UTC courant)
+CONDITIONAL_GET_PATHS = {
+    "/api/summary",
+    "/api/pnl-by-day",
+    "/api/deals",
+    "/api/drawdown",
+    "/api/equity-curve",
+    "/api/metrics",
+    "/api/monthly-performance",
+    "/api/symbol-stats",
+    "/api/dashboard",   # seulement avec open_trades=0 (sinon contient du live)
+}
+# la génération repart de 0 au redémarrage : le sel évite de valider un vieil ETag
+_ETAG_SALT = f"{os.getpid()}-{time.time()}"
+# le navigateur garde la réponse mais revalide à chaque fois (coût : un 304)
+ANALYTICS_CACHE_CONTROL = "private, no-cache"
+
+
+# valeurs "faux" d'un paramètre bool FastAPI/pydantic (insensible à la casse)
+_FALSE_QUERY_VALUES = ("0", "off", "f", "false", "n", "no")
+
+
+def _is_conditional(request: Request) -> bool:
+    if request.method != "GET" or request.url.path not in CONDITIONAL_GET_PATHS:
+        return False
+    if request.url.path == "/api/dashboard":
+        # même lecture que le paramètre `open_trades: bool` de l'endpoint
+        return request.query_params.get("open_trades", "").lower() in _FALSE_QUERY_VALUES
+    return True
+
+
+def _validators(request: Request) -> Dict[str, str]:
+    """
+    ETag (génération + jour UTC + chemin + paramètres) et Last-Modified.
+    ETag faible : le même contenu part gzip ou non selon Accept-Encoding
+    (GZipMiddleware), les octets diffèrent ; Vary le signale aux caches.
+    """
+    today = time.strftime("%Y-%m-%d", time.gmtime())
+    params = sorted(request.query_params.multi_items())
+    raw = f"{_ETAG_SALT}|{db.get_data_generation()}|{today}|{request.url.path}|{params}"
+    etag = 'W/"' + hashlib.blake2b(raw.encode(), digest_size=12).hexdigest() + '"'
+    # les fenêtres "N derniers jours" glissent à minuit UTC : date de modif au moins minuit
+    midnight = time.time() // 86400 * 86400
+    last_modified = formatdate(max(db.get_data_changed_at(), midnight), usegmt=True)
+    return {
+        "ETag": etag,
+        "Last-Modified": last_modified,
+        "Cache-Control": ANALYTICS_CACHE_CONTROL,
+        "Vary": "Accept-Encoding",
+    }
+
+
+def _not_modified(request: Request, validators: Dict[str, str]) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # If-None-Match prioritaire sur If-Modified-Since (RFC 9110) ;
+        # comparaison faible : préfixe W/ ignoré des deux côtés
+        tags = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+        return "*" in tags or validators["ETag"].removeprefix("W/") in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+            last_modified = parsedate_to_datetime(validators["Last-Modified"])
+        except (TypeError, ValueError):
+            return False
+        return last_modified <= since
+    return False
+
+
+@app.middleware("http")
+async def conditional_get(request: Request, call_next):
+    if not _is_conditional(request):
+        return await call_next(request)
+
+    validators = _validators(request)
+    if _not_modified(request, validators):
+        return Response(status_code=304, headers=validators)
+
+    response = await call_next(request)
+    if response.status_code == 200:
+        vary = response.headers.get("vary")
+        response.headers.update(validators)
+        if vary and "accept-encoding" not in vary.lower():
+            response.headers["Vary"] = f"{vary}, Accept-Encoding"
+    return response
+
+
+# ---------------------------------------------------------------------------
+# MOTEUR ANALYTICS : "memory" (numpy, vectorisé) ou "sql" (rollups SQLite)
+# ---------------------------------------------------------------------------
+ANALYTICS_ENGINE = os.getenv("ANALYTICS_ENGINE", "sql").lower()
+
+
+def _analytics(name: str):
+    """Panneau `name` (summary, pnl_by_day, ...) du moteur configuré ; mêmes sorties."""
+    if ANALYTICS_ENGINE == "memory":
+        return getattr(analytics_engine, name)
+    return getattr(db, f"{name}_from_db")
+
+
+# ---------------------------------------------------------------------------
+# FORMAT COLONNAIRE (opt-in : ?format=columns)
+# ---------------------------------------------------------------------------
+# Une liste par colonne au lieu d'un dict par ligne : les noms de clés ne sont
+# plus répétés à chaque ligne (deals : 19 clés × 1000 lignes).
+RESPONSE_FORMAT_QUERY = Query("rows", pattern="^(rows|columns)$")
+
+
+def rows_to_columns(rows: List[Dict[str, Any]]) -> Dict[str, List[Any]]:
+    """[{a: 1, b: 2}, {a: 3, b: 4}] → {a: [1, 3], b: [2, 4]}"""
+    if not rows:
+        return {}
+    return {key: [r.get(key) for r in rows] for key in rows[0]}
+
+
+def _with_columns(payload: Dict[str, Any], key: str = "items") -> Dict[str, Any]:
+    """Copie du payload (peut venir du cache) avec `key` en colonnes."""
+    return {**payload, key: rows_to_columns(payload[key]), "format": "columns"}
+
+
+def _columnar_dashboard(panels: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        **panels,
+        "pnl_by_day": rows_to_columns(panels["pnl_by_day"]),
+        "drawdown": _with_columns(panels["drawdown"]),
+        "deals": _with_columns(panels["deals"]),
+        "format": "columns",
+    }
+
+
 # ---------------------------------------------------------------------------
 # ENDPOINTS API DASHBOARD → délégués à dashboard_db
 # ---------------------------------------------------------------------------
@@ -197,16 +488,23 @@ def dashboard_page():
 def api_summary(
     days: int = Query(30, ge=1, le=365),
     symbol: Optional[str] = None,
+    account: Optional[str] = None,
 ) -> Dict[str, Any]:
-    return db.summary_from_db(days=days, symbol=symbol)
+    return _analytics("summary")(days=days, symbol=symbol, account=account)
 
 
 @app.get("/api/pnl-by-day")
 def api_pnl_by_day(
     days: int = Query(30, ge=1, le=365),
     symbol: Optional[str] = None,
+    account: Optional[str] = None,
+    format: str = RESPONSE_FORMAT_QUERY,
 ) -> List[Dict[str, Any]]:
-    return db.pnl_by_day_from_db(days=days, symbol=symbol)
+    """`format=columns` → {"day": [...], "pnl": [...]}"""
+    daily = _analytics("pnl_by_day")(days=days, symbol=symbol, account=account)
+    if format == "columns":
+        return FastJSONResponse(rows_to_columns(daily))
+    return daily
 
 
 @app.get("/api/deals")
@@ -215,46 +513,174 @@ def api_deals(
     symbol: Optional[str] = None,
     limit: int = Query(100, ge=1, le=1000),
     offset: int = Query(0, ge=0),
+    cursor: Optional[str] = None,
+    account: Optional[str] = None,
+    format: str = RESPONSE_FORMAT_QUERY,
 ) -> Dict[str, Any]:
-    return db.list_deals_from_db(days=days, symbol=symbol, limit=limit, offset=offset)
+    """
+    Pagination keyset : passer `cursor=<next_cursor>` de la page précédente
+    (coût constant par page). `offset` reste accepté pour compatibilité.
+    `format=columns` : `items` devient {colonne: [valeurs]}.
+    """
+    try:
+        page = db.list_deals_from_db(
+            days=days, symbol=symbol, limit=limit, offset=offset, cursor=cursor,
+            account=account,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if format == "columns":
+        return FastJSONResponse(_with_columns(page))
+    return page
 
 
 @app.get("/api/drawdown")
 def api_drawdown(
     days: int = Query(30, ge=1, le=365),
     symbol: Optional[str] = None,
+    account: Optional[str] = None,
+    format: str = RESPONSE_FORMAT_QUERY,
 ) -> Dict[str, Any]:
-    return db.drawdown_from_db(days=days, symbol=symbol)
+    """`format=columns` : `items` devient {"day": [...], "equity": [...], "drawdown": [...]}."""
+    curve = _analytics("drawdown")(days=days, symbol=symbol, account=account)
+    if format == "columns":
+        return FastJSONResponse(_with_columns(curve))
+    return curve
+
+
+@app.get("/api/equity-curve")
+def api_equity_curve(
+    days: int = Query(365, ge=1, le=3650),
+    symbol: Optional[str] = None,
+    account: Optional[str] = None,
+    points: int = Query(1000, ge=3, le=10000),
+    format: str = RESPONSE_FORMAT_QUERY,
+) -> Dict[str, Any]:
+    """
+    Equity + drawdown au deal près (drawdowns intrajournaliers, indépendant
+    des frontières de jour UTC), durée max sous l'eau et récupération du
+    drawdown max ; série ramenée à `points` points (LTTB) pour les graphes.
+    Toujours calculée par le moteur en mémoire (les rollups sont journaliers).
+    """
+    curve = analytics_engine.equity_curve(days=days, symbol=symbol, account=account, points=points)
+    if format == "columns":
+        return FastJSONResponse(_with_columns(curve))
+    return curve
+
+
+@app.get("/api/metrics")
+def api_metrics(
+    days: Optional[int] = Query(None, ge=1, le=3650),
+    symbol: Optional[str] = None,
+    account: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Profit factor, espérance, gain / perte moyens, séries, perte consécutive
+    max, Sharpe / Sortino journaliers (sorties uniquement).
+    Sans `days` ni `symbol` : depuis le début, tenues à jour à l'ingestion.
+    """
+    return analytics_engine.performance_metrics(days=days, symbol=symbol, account=account)
 
 
 @app.get("/api/monthly-performance")
 def api_monthly_performance(
     days: int = Query(180, ge=1, le=730),
     symbol: Optional[str] = None,
+    account: Optional[str] = None,
 ) -> Dict[str, Any]:
-    return db.monthly_performance_from_db(days=days, symbol=symbol)
+    return _analytics("monthly_performance")(days=days, symbol=symbol, account=account)
 
 
 @app.get("/api/symbol-stats")
 def api_symbol_stats(
     days: int = Query(90, ge=1, le=365),
     symbol: Optional[str] = None,
+    account: Optional[str] = None,
 ) -> Dict[str, Any]:
-    return db.symbol_stats_from_db(days=days, symbol=symbol)
+    return _analytics("symbol_stats")(days=days, symbol=symbol, account=account)
+
+
+@app.get("/api/accounts")
+def api_accounts() -> Dict[str, Any]:
+    """Comptes configurés + comptes présents en base, avec état de sync."""
+    known = {a["account_id"]: a for a in db.list_accounts()}
+    items = []
+    for account_id in dict.fromkeys([*METAS, *known]):
+        state = known.get(account_id, {})
+        meta = METAS.get(account_id)
+        items.append(
+            {
+                "account_id": account_id,
+                "configured": meta is not None,
+                "connected": bool(meta and meta._connected),
+                "backfill_done": bool(state.get("backfill_done")),
+                "watermark_ms": state.get("watermark_ms"),
+                "last_reconcile": LAST_RECONCILE.get(account_id),
+            }
+        )
+    return {"count": len(items), "items": items}
+
+
+@app.get("/api/cache-stats")
+def api_cache_stats() -> Dict[str, Any]:
+    """Métriques du cache analytics (hits, misses, hit_ratio...)."""
+    return {
+        "generation": db.get_data_generation(),
+        **db.ANALYTICS_CACHE.stats(),
+        "engine": ANALYTICS_ENGINE,
+        "engine_stats": analytics_engine.ENGINE.stats() if analytics_engine.ENGINE.loaded else None,
+    }
 
 
 # ---------------------------------------------------------------------------
 # POSITIONS OUVERTES (LIVE) VIA METAAPI
 # ---------------------------------------------------------------------------
-@app.get("/api/open-trades")
-async def api_open_trades(symbol: Optional[str] = None) -> Dict[str, Any]:
+def _format_position(p: Dict[str, Any], account_id: str) -> Dict[str, Any]:
+    """Position MetaApi (RPC ou streaming) → item du dashboard."""
+    pos = dict(p)
+
+    unreal = pos.get("unrealizedProfit")
+    raw_profit = pos.get("profit")
+    display_profit = unreal if unreal is not None else raw_profit
+
+    # le SDK renvoie des datetime : ISO dès ici (tri + sérialisation SSE)
+    time_value = pos.get("updateTime") or pos.get("time")
+    if isinstance(time_value, datetime):
+        time_value = time_value.isoformat()
+
+    return {
+        "id": pos.get("id"),
+        "account": account_id,
+        "symbol": pos.get("symbol"),
+        "type": pos.get("type"),
+        "volume": pos.get("volume"),
+        "openPrice": pos.get("openPrice"),
+        "profit": raw_profit,
+        "unrealizedProfit": unreal,
+        "displayProfit": display_profit,
+        "swap": pos.get("swap"),
+        "commission": pos.get("commission"),
+        "time": time_value,
+        "stopLoss": pos.get("stopLoss"),
+        "takeProfit": pos.get("takeProfit"),
+    }
+
+
+async def _open_trades_payload(
+    symbol: Optional[str] = None,
+    account: Optional[str] = None,
+) -> Dict[str, Any]:
     """
-    Retourne les positions ouvertes (live) depuis MetaAPI.
-    - Utilise exclusivement META.get_open_positions() (wrapper RPC existant)
+    Positions ouvertes (live) depuis MetaAPI.
+    - Utilise get_open_positions_async() : non bloquant, un seul appel RPC
+      en vol par compte, résultat mis en cache OPEN_POSITIONS_TTL_SECONDS
+    - Tous les comptes connectés, ou un seul via ?account=<id>
     - Peut filtrer par symbole via ?symbol=XAUUSD
     - Expose `profit`, `unrealizedProfit` et `displayProfit` pour le dashboard
     """
-    if not META._connected:
+    clients = [_get_client(account)] if account else list(METAS.values())
+    clients = [meta for meta in clients if meta._connected]
+    if not clients:
         return {
             "count": 0,
             "items": [],
@@ -262,8 +688,10 @@ async def api_open_trades(symbol: Optional[str] = None) -> Dict[str, Any]:
         }
 
     try:
-        # ⇨ appel à ton wrapper RPC existant (aucune nouvelle méthode MetaApi)
-        positions = META.get_open_positions()
+        # ⇨ appel à ton wrapper RPC existant, comptes interrogés en parallèle
+        results = await asyncio.gather(
+            *(meta.get_open_positions_async() for meta in clients)
+        )
     except Exception as e:
         logger.error(f"Erreur MetaApi get_open_positions: {e}")
         raise HTTPException(
@@ -274,34 +702,15 @@ async def api_open_trades(symbol: Optional[str] = None) -> Dict[str, Any]:
     filtered: List[Dict[str, Any]] = []
     symbol_filter = symbol.upper() if symbol else None
 
-    for p in positions:
-        pos = dict(p)
+    all_positions = [
+        (meta.account_id, p) for meta, positions in zip(clients, results) for p in positions
+    ]
 
-        sym = (pos.get("symbol") or "").upper()
+    for account_id, p in all_positions:
+        sym = (p.get("symbol") or "").upper()
         if symbol_filter and sym != symbol_filter:
             continue
-
-        unreal = pos.get("unrealizedProfit")
-        raw_profit = pos.get("profit")
-        display_profit = unreal if unreal is not None else raw_profit
-
-        filtered.append(
-            {
-                "id": pos.get("id"),
-                "symbol": pos.get("symbol"),
-                "type": pos.get("type"),
-                "volume": pos.get("volume"),
-                "openPrice": pos.get("openPrice"),
-                "profit": raw_profit,
-                "unrealizedProfit": unreal,
-                "displayProfit": display_profit,
-                "swap": pos.get("swap"),
-                "commission": pos.get("commission"),
-                "time": pos.get("updateTime") or pos.get("time"),
-                "stopLoss": pos.get("stopLoss"),
-                "takeProfit": pos.get("takeProfit"),
-            }
-        )
+        filtered.append(_format_position(p, account_id))
 
     # Trier par time décroissant (les plus récents en haut)
     filtered.sort(key=lambda x: x.get("time") or "", reverse=True)
@@ -309,6 +718,108 @@ async def api_open_trades(symbol: Optional[str] = None) -> Dict[str, Any]:
     return {
         "count": len(filtered),
         "symbol_filter": symbol_filter,
+        "account_filter": account,
+        "accounts": [meta.account_id for meta in clients],
         "items": filtered,
         "status": "ok",
     }
+
+
+@app.get("/api/open-trades")
+async def api_open_trades(
+    symbol: Optional[str] = None,
+    account: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Retourne les positions ouvertes (live) depuis MetaAPI."""
+    return await _open_trades_payload(symbol=symbol, account=account)
+
+
+# ---------------------------------------------------------------------------
+# POSITIONS LIVE : FLUX SSE (UN PRODUCTEUR → N ONGLETS)
+# ---------------------------------------------------------------------------
+LIVE_POSITIONS_REFRESH_SECONDS = float(os.getenv("LIVE_POSITIONS_REFRESH_SECONDS", "10"))
+LIVE_POSITIONS_PUSH_SECONDS = float(os.getenv("LIVE_POSITIONS_PUSH_SECONDS", "0.5"))
+SSE_HEARTBEAT_SECONDS = 15
+
+# Les événements streaming alimentent le hub en continu ; le rafraîchissement
+# RPC (tous comptes, sans filtre) ne sert que de filet de sécurité.
+LIVE = PositionsHub(
+    fetch=_open_trades_payload,
+    refresh_interval=LIVE_POSITIONS_REFRESH_SECONDS,
+    push_interval=LIVE_POSITIONS_PUSH_SECONDS,
+)
+
+
+@app.get("/api/open-trades/stream")
+async def api_open_trades_stream(
+    request: Request,
+    symbol: Optional[str] = None,
+    account: Optional[str] = None,
+) -> StreamingResponse:
+    """
+    Server-Sent Events : un snapshot à la connexion puis des diffs
+    {"type": "diff", "upserts": [...], "removed": ["compte:id", ...]}.
+    Remplace le polling de /api/open-trades par le dashboard.
+    """
+    if account:
+        _get_client(account)  # 404 si compte inconnu
+
+    sub = LIVE.subscribe(symbol=symbol, account=account)
+
+    async def events():
+        try:
+            yield "retry: 3000\n\n"  # reconnexion auto du navigateur
+            while True:
+                try:
+                    message = await asyncio.wait_for(sub.queue.get(), SSE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": ping\n\n"  # garde la connexion ouverte (proxies)
+                    continue
+                payload = json.dumps(jsonable_encoder(message), separators=(",", ":"))
+                yield f"data: {payload}\n\n"
+        finally:
+            LIVE.unsubscribe(sub)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# ---------------------------------------------------------------------------
+# BOOTSTRAP DASHBOARD : TOUS LES PANNEAUX EN UN ALLER-RETOUR
+# ---------------------------------------------------------------------------
+@app.get("/api/dashboard")
+async def api_dashboard(
+    days: int = Query(30, ge=1, le=365),
+    symbol: Optional[str] = None,
+    account: Optional[str] = None,
+    deals_limit: int = Query(100, ge=1, le=1000),
+    open_trades: bool = True,
+    format: str = RESPONSE_FORMAT_QUERY,
+) -> Dict[str, Any]:
+    """
+    Summary, PNL/jour, drawdown, mensuel, stats symboles et derniers deals
+    (un seul instantané SQLite, mis en cache par génération) + positions
+    live, récupérées en parallèle.
+    `open_trades=0` : panneaux DB seuls → réponse validable par ETag (304).
+    `format=columns` : séries PNL/jour, drawdown et deals en colonnes.
+    """
+    panels_job = asyncio.to_thread(
+        _analytics("dashboard"),
+        days=days, symbol=symbol, account=account, deals_limit=deals_limit,
+    )
+    if not open_trades:
+        panels = await panels_job
+    else:
+        panels, live = await asyncio.gather(
+            panels_job, _open_trades_payload(symbol=symbol, account=account)
+        )
+        panels = {**panels, "open_trades": live}
+
+    if format == "columns":
+        return FastJSONResponse(_columnar_dashboard(panels))
+    return panels
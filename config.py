@@ -5,6 +5,10 @@ load_dotenv()  # charge automatiquement .env
 
 API_KEY = os.getenv("API_KEY")
 ACCOUNT_ID = os.getenv("ACCOUNT_ID")
+# Multi-comptes : ACCOUNT_IDS=id1,id2,... (par défaut le seul ACCOUNT_ID)
+ACCOUNT_IDS = [
+    a.strip() for a in os.getenv("ACCOUNT_IDS", ACCOUNT_ID or "").split(",") if a.strip()
+]
 
 TOKEN = os.getenv("TOKEN")
 TELEGRAM_USER = os.getenv("TELEGRAM_USER")
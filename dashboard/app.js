@@ -77,11 +77,15 @@ async function loadEquity() {
 /* Load Live Positions */
 async function loadOpenTrades() {
   const data = await fetchJSON("/api/open-trades");
+  renderOpenTrades(data.items);
+}
+
+function renderOpenTrades(items) {
   const tbody = document.querySelector("#open-trades tbody");
 
   tbody.innerHTML = "";
 
-  data.items.forEach((p) => {
+  items.forEach((p) => {
     const cls = p.profit >= 0 ? "pnl-positive" : "pnl-negative";
 
     tbody.innerHTML += `
@@ -97,6 +101,40 @@ async function loadOpenTrades() {
   });
 }
 
+/* Live positions pushed over SSE (snapshot, then diffs keyed "account:id");
+   falls back to polling every 10s when EventSource is unavailable */
+let liveSource = null;
+let livePollTimer = null;
+const livePositions = new Map();
+
+function positionKey(p) {
+  return `${p.account ?? ""}:${p.id}`;
+}
+
+function startOpenTradesStream() {
+  if (liveSource) liveSource.close();
+  if (livePollTimer) clearInterval(livePollTimer);
+
+  if (!window.EventSource) {
+    loadOpenTrades();
+    livePollTimer = setInterval(loadOpenTrades, 10000);
+    return;
+  }
+
+  liveSource = new EventSource("/api/open-trades/stream");
+  liveSource.onmessage = (event) => {
+    const msg = JSON.parse(event.data);
+    if (msg.type === "snapshot") {
+      livePositions.clear();
+      (msg.items || []).forEach((p) => livePositions.set(positionKey(p), p));
+    } else if (msg.type === "diff") {
+      (msg.removed || []).forEach((key) => livePositions.delete(key));
+      (msg.upserts || []).forEach((p) => livePositions.set(positionKey(p), p));
+    }
+    renderOpenTrades(Array.from(livePositions.values()));
+  };
+}
+
 /* Load last deals */
 async function loadDeals() {
   const days = document.getElementById("days").value;
@@ -130,7 +168,6 @@ async function loadDeals() {
 async function reloadAll() {
   loadSummary();
   loadEquity();
-  loadOpenTrades();
   loadDeals();
 }
 
@@ -139,6 +176,4 @@ document.getElementById("reload-btn").onclick = reloadAll;
 
 /* Initial load */
 reloadAll();
-
-/* Auto-refresh LIVE positions every 10s */
-setInterval(loadOpenTrades, 10000);
+startOpenTradesStream();
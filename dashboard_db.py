@@ -1,68 +1,296 @@
 # dashboard_db.py PRO
+import os
+import time
+import base64
+import calendar
 import sqlite3
+import inspect
+import operator
+import threading
+import functools
+import contextlib
+import zlib
+import logging
 from pathlib import Path
-from datetime import datetime, timedelta
-from typing import Optional, Dict, Any, List
+from datetime import datetime, timezone
+from typing import Optional, Dict, Any, Callable, Iterator, List, Tuple
+
+from analytics_cache import AnalyticsCache
+
+logger = logging.getLogger("dashboard_db")
 
 BASE_DIR = Path(__file__).resolve().parent
 DB_PATH = BASE_DIR / "trades.db"
 
+# Réglages SQLite (surchargeables par variables d'environnement)
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+# cache de pages PAR CONNEXION (une par thread : executor asyncio + threadpool
+# FastAPI → des dizaines) : petit, les lectures passent par le mmap
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "4096"))         # 4 Mo
+# porté le temps d'une ingestion ou d'une migration, puis rendu
+SQLITE_WRITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_WRITE_CACHE_SIZE_KB", "32768"))  # 32 Mo
+# mappage du fichier : pages partagées par toutes les connexions (cache OS),
+# espace d'adressage seulement, pas une copie par connexion
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))  # 256 Mo
+
 
-def get_db_connection():
-    conn = sqlite3.connect(DB_PATH)
+# ---------------------------------------------------------------------------
+# CONNEXIONS SQLITE : une connexion réutilisable par thread (WAL)
+# ---------------------------------------------------------------------------
+_local = threading.local()
+_all_connections: List[sqlite3.Connection] = []
+_all_connections_lock = threading.Lock()
+# incrémenté par close_all_connections : les connexions d'avant sont rouvertes
+_connections_epoch = 0
+
+
+def _open_connection() -> sqlite3.Connection:
+    """
+    Ouvre une connexion configurée (WAL + pragmas). Utilisée par un seul
+    thread, mais check_same_thread=False : close_all_connections doit pouvoir
+    la fermer depuis le thread du shutdown.
+    """
+    conn = sqlite3.connect(DB_PATH, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
     conn.row_factory = sqlite3.Row
+
+    # WAL : les lectures du dashboard ne sont plus bloquées par la sync
+    conn.execute("PRAGMA journal_mode=WAL")
+    # NORMAL suffit en WAL (durable au checkpoint, jamais corrompu)
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    # valeur négative = taille en Ko
+    conn.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+    conn.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    return conn
+
+
+def get_db_connection() -> sqlite3.Connection:
+    """
+    Retourne la connexion SQLite du thread courant (créée au premier appel).
+    La connexion est partagée : les appelants ne doivent PAS la fermer.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.epoch != _connections_epoch:
+        conn = _open_connection()
+        with _all_connections_lock:
+            _all_connections.append(conn)
+            _local.conn, _local.epoch = conn, _connections_epoch
     return conn
 
 
+def close_all_connections() -> None:
+    """
+    Ferme toutes les connexions ouvertes, quel que soit leur thread (à
+    appeler au shutdown). Un thread qui relit ensuite la DB en rouvre une.
+    """
+    global _connections_epoch
+    with _all_connections_lock:
+        conns = list(_all_connections)
+        _all_connections.clear()
+        _connections_epoch += 1
+
+    failed = 0
+    for conn in conns:
+        try:
+            conn.close()
+        except sqlite3.Error as e:
+            failed += 1
+            logger.error(f"❌ Fermeture d'une connexion SQLite impossible: {e}")
+
+    _local.conn = None
+    if failed:
+        logger.warning(f"⚠ {failed}/{len(conns)} connexions SQLite non fermées")
+
+
+@contextlib.contextmanager
+def write_cache(conn: sqlite3.Connection):
+    """
+    Cache de pages de `conn` porté à SQLITE_WRITE_CACHE_SIZE_KB le temps du
+    bloc (pages modifiées + index d'une grosse transaction), puis ramené à
+    SQLITE_CACHE_SIZE_KB : la mémoire est rendue au lieu de rester acquise
+    par chaque thread qui a écrit une fois.
+    """
+    conn.execute(f"PRAGMA cache_size=-{SQLITE_WRITE_CACHE_SIZE_KB}")
+    try:
+        yield conn
+    finally:
+        conn.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+
+
+@contextlib.contextmanager
+def read_snapshot():
+    """
+    Transaction de lecture sur la connexion du thread : toutes les requêtes
+    du bloc voient le même instantané WAL (écritures concurrentes invisibles).
+    """
+    conn = get_db_connection()
+    if conn.in_transaction:
+        yield conn
+        return
+    conn.execute("BEGIN")
+    try:
+        yield conn
+    finally:
+        conn.commit()
+
+
 # ---------------------------------------------------------------------------
-# INIT DB + INDEXES (PRO)
+# GÉNÉRATION DES DONNÉES (incrémentée à chaque ingestion qui change la DB)
 # ---------------------------------------------------------------------------
-def init_db():
-    """Initialise la DB + index optimisés."""
-    conn = get_db_connection()
-    cur = conn.cursor()
+_generation = 0
+_generation_changed_at = time.time()
+# incrémentée quand des lignes existantes sont réécrites (pas seulement ajoutées)
+_rewrite_generation = 0
+_generation_lock = threading.Lock()
 
-    # Table deals (alignée sur history_sync._save_deals_to_db)
-    cur.execute("""
+
+def get_data_generation() -> int:
+    """Numéro de version des données : sert de clé aux caches de lecture."""
+    return _generation
+
+
+def get_data_changed_at() -> float:
+    """Timestamp (epoch s) du dernier changement de données."""
+    return _generation_changed_at
+
+
+def get_rewrite_generation() -> int:
+    """Change seulement si des deals existants ont été modifiés (copies en mémoire à recharger)."""
+    return _rewrite_generation
+
+
+def bump_data_generation(rewrite: bool = False) -> int:
+    global _generation, _generation_changed_at, _rewrite_generation
+    with _generation_lock:
+        _generation += 1
+        _generation_changed_at = time.time()
+        if rewrite:
+            _rewrite_generation += 1
+        return _generation
+
+
+# ---------------------------------------------------------------------------
+# CACHE DES RÉSULTATS ANALYTICS (clé = fonction + paramètres + génération)
+# ---------------------------------------------------------------------------
+ANALYTICS_CACHE = AnalyticsCache(
+    max_entries=int(os.getenv("ANALYTICS_CACHE_SIZE", "512"))
+)
+
+
+def cached_by_generation(func):
+    """
+    Met en cache le résultat de `func` tant que les données n'ont pas changé.
+    La clé contient aussi le jour UTC courant (fenêtres "derniers N jours").
+    Le résultat est partagé : les appelants ne doivent pas le modifier.
+    """
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        if isinstance(bound.arguments.get("symbol"), str):
+            bound.arguments["symbol"] = bound.arguments["symbol"].upper()
+        key = (
+            func.__name__,
+            tuple(bound.arguments.items()),
+            get_data_generation(),
+            time.strftime("%Y-%m-%d", time.gmtime()),
+        )
+        return ANALYTICS_CACHE.get_or_compute(key, lambda: func(*bound.args, **bound.kwargs))
+
+    return wrapper
+
+
+# ---------------------------------------------------------------------------
+# SCHÉMA UNIQUE + MIGRATIONS VERSIONNÉES (PRAGMA user_version)
+# ---------------------------------------------------------------------------
+# (colonne, déclaration) — source unique pour CREATE TABLE et migrations
+DEAL_SCHEMA = (
+    ("id", "TEXT PRIMARY KEY"),
+    ("account_id", "TEXT"),
+    ("platform", "TEXT"),
+    ("type", "TEXT"),
+    ("time", "TEXT"),            # ISO UTC normalisé : 2025-01-31T12:34:56.789Z
+    ("time_ms", "INTEGER"),      # epoch millisecondes (UTC) → filtres de période
+    ("day", "TEXT"),             # bucket jour  'YYYY-MM-DD' (UTC)
+    ("month", "TEXT"),           # bucket mois  'YYYY-MM'    (UTC)
+    ("broker_time", "TEXT"),
+    ("commission", "REAL"),
+    ("swap", "REAL"),
+    ("profit", "REAL"),
+    ("symbol", "TEXT"),
+    ("magic", "INTEGER"),
+    ("order_id", "TEXT"),
+    ("position_id", "TEXT"),
+    ("reason", "TEXT"),
+    ("broker_comment", "TEXT"),
+    ("entry_type", "TEXT"),
+    ("volume", "REAL"),
+    ("price", "REAL"),
+    ("stop_loss", "REAL"),
+    ("take_profit", "REAL"),
+    ("account_currency_exchangeRate", "REAL"),
+)
+
+# Index couvrants : les agrégats *_from_db se font sans lire la table
+DEAL_INDEXES = {
+    "idx_deals_time_cover":
+        "deals(time_ms, type, symbol, profit, entry_type, day, month)",
+    "idx_deals_symbol_time_cover":
+        "deals(symbol, time_ms, type, profit, entry_type, day, month)",
+    "idx_deals_account_time":
+        "deals(account_id, time_ms)",
+    # pagination keyset de list_deals_from_db : ORDER BY time_ms DESC, id DESC
+    "idx_deals_time_id":
+        "deals(time_ms, id)",
+}
+
+# Anciens index mono-colonne (remplacés par les index couvrants)
+LEGACY_INDEXES = ("idx_time", "idx_symbol", "idx_profit", "idx_entry_type", "idx_type")
+
+
+def _table_columns(cur: sqlite3.Cursor, table: str) -> set:
+    cur.execute(f"PRAGMA table_info({table})")
+    return {r[1] for r in cur.fetchall()}
+
+
+def _migrate_v1(cur: sqlite3.Cursor) -> None:
+    """
+    Unifie les deux anciens schémas `deals` (mt_bot / dashboard) :
+    ajoute les colonnes manquantes, calcule time_ms/day/month depuis le
+    texte ISO existant et remplace les index mono-colonne.
+    """
+    columns_sql = ",\n            ".join(f"{c} {d}" for c, d in DEAL_SCHEMA)
+    cur.execute(f"""
         CREATE TABLE IF NOT EXISTS deals (
-            id TEXT PRIMARY KEY,
-            platform TEXT,
-            type TEXT,
-            time TEXT,
-            broker_time TEXT,
-            commission REAL,
-            swap REAL,
-            profit REAL,
-            symbol TEXT,
-            magic INTEGER,
-            order_id TEXT,
-            position_id TEXT,
-            reason TEXT,
-            broker_comment TEXT,
-            entry_type TEXT,
-            volume REAL,
-            price REAL,
-            stop_loss REAL,
-            take_profit REAL,
-            account_currency_exchangeRate REAL
+            {columns_sql}
         )
     """)
 
-    # Index PRO
-    cur.execute("CREATE INDEX IF NOT EXISTS idx_time ON deals(time)")
-    cur.execute("CREATE INDEX IF NOT EXISTS idx_symbol ON deals(symbol)")
-    cur.execute("CREATE INDEX IF NOT EXISTS idx_profit ON deals(profit)")
-    cur.execute("CREATE INDEX IF NOT EXISTS idx_entry_type ON deals(entry_type)")
-    cur.execute("CREATE INDEX IF NOT EXISTS idx_type ON deals(type)")
+    existing = _table_columns(cur, "deals")
+    for col, decl in DEAL_SCHEMA:
+        if col not in existing:
+            cur.execute(f"ALTER TABLE deals ADD COLUMN {col} {decl}")
 
-    conn.commit()
-    conn.close()
+    # anciennes lignes : time texte (ISO avec 'T' ou ' ', 'Z' ou offset)
+    cur.execute("""
+        UPDATE deals SET
+            time_ms = CAST(ROUND((julianday(time) - 2440587.5) * 86400000) AS INTEGER),
+            time = strftime('%Y-%m-%dT%H:%M:%fZ', time),
+            day = strftime('%Y-%m-%d', time),
+            month = strftime('%Y-%m', time)
+        WHERE time_ms IS NULL AND julianday(time) IS NOT NULL
+    """)
 
+    for name in LEGACY_INDEXES:
+        cur.execute(f"DROP INDEX IF EXISTS {name}")
+    for name, target in DEAL_INDEXES.items():
+        cur.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {target}")
 
-# ---------------------------------------------------------------------------
-# Helpers de filtre (exclure BALANCE / CREDIT / CHARGE des stats)
-# ---------------------------------------------------------------------------
-# Liste des types qu'on NE veut PAS compter dans les stats de trading
+
+# Types qu'on NE veut PAS compter dans les stats de trading (exclus des rollups)
 NON_TRADE_TYPES = (
     "DEAL_TYPE_BALANCE",
     "DEAL_TYPE_CREDIT",
@@ -70,107 +298,745 @@ NON_TRADE_TYPES = (
     "DEAL_TYPE_CORRECTION",
 )
 
+# Tables de rollup (jour × symbole × compte, mois × symbole × compte)
+ROLLUP_TABLES = (("deal_daily", "day"), ("deal_monthly", "month"))
+
+# (colonne, expression d'un deal) — `{r}` = NEW / OLD / deals
+ROLLUP_MEASURES = (
+    ("nb_deals", "1"),
+    ("pnl", "{r}.profit"),
+    ("wins", "({r}.profit > 0)"),
+    ("losses", "({r}.profit <= 0)"),
+    # sortie = DEAL_ENTRY_OUT, ou entry_type absent (comptes qui ne l'envoient pas)
+    ("exit_wins", "({r}.profit > 0 AND COALESCE({r}.entry_type, 'DEAL_ENTRY_OUT') = 'DEAL_ENTRY_OUT')"),
+    ("exit_losses", "({r}.profit <= 0 AND COALESCE({r}.entry_type, 'DEAL_ENTRY_OUT') = 'DEAL_ENTRY_OUT')"),
+    ("commission", "COALESCE({r}.commission, 0)"),
+    ("swap", "COALESCE({r}.swap, 0)"),
+)
+
 
-def _trade_type_filter_sql(alias: str = "deals") -> str:
+def _rollup_condition_sql(r: str, bucket: str) -> str:
+    """Deal compté dans les stats : trade (pas BALANCE/CREDIT...) avec profit."""
+    types = ", ".join(f"'{t}'" for t in NON_TRADE_TYPES)
+    return (
+        f"{r}.{bucket} IS NOT NULL AND {r}.profit IS NOT NULL "
+        f"AND ({r}.type IS NULL OR {r}.type NOT IN ({types}))"
+    )
+
+
+def _rollup_delta_sql(table: str, bucket: str, r: str, sign: int) -> str:
+    """Ajoute (sign=1) ou retire (sign=-1) la contribution du deal `r`."""
+    names = ", ".join(m for m, _ in ROLLUP_MEASURES)
+    values = ", ".join(f"{sign} * {expr.format(r=r)}" for _, expr in ROLLUP_MEASURES)
+    updates = ", ".join(f"{m} = {m} + excluded.{m}" for m, _ in ROLLUP_MEASURES)
+    return f"""
+        INSERT INTO {table} ({bucket}, symbol, account_id, {names})
+        SELECT {r}.{bucket}, COALESCE({r}.symbol, ''), COALESCE({r}.account_id, ''), {values}
+        WHERE {_rollup_condition_sql(r, bucket)}
+        ON CONFLICT({bucket}, symbol, account_id) DO UPDATE SET {updates};
     """
-    Retourne un bout de clause SQL pour exclure les non-trades.
-    alias: nom de la table (utile si on fait des JOIN plus tard).
+
+
+def _migrate_v2(cur: sqlite3.Cursor) -> None:
     """
-    return (
-        f"AND ({alias}.type IS NULL "
-        f"OR {alias}.type NOT IN ({', '.join(['?' for _ in NON_TRADE_TYPES])}))"
+    Rollups jour/mois maintenus par triggers : chaque INSERT / UPDATE / DELETE
+    sur deals met à jour les agrégats dans la même transaction.
+    """
+    measures_sql = ", ".join(
+        f"{m} {'REAL' if m in ('pnl', 'commission', 'swap') else 'INTEGER'} NOT NULL DEFAULT 0"
+        for m, _ in ROLLUP_MEASURES
     )
+    for table, bucket in ROLLUP_TABLES:
+        cur.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                {bucket} TEXT NOT NULL,
+                symbol TEXT NOT NULL,
+                account_id TEXT NOT NULL,
+                {measures_sql},
+                PRIMARY KEY ({bucket}, symbol, account_id)
+            ) WITHOUT ROWID
+        """)
+
+        cur.execute(f"DROP TRIGGER IF EXISTS trg_{table}_ins")
+        cur.execute(f"DROP TRIGGER IF EXISTS trg_{table}_upd")
+        cur.execute(f"DROP TRIGGER IF EXISTS trg_{table}_del")
+        cleanup = f"DELETE FROM {table} WHERE {bucket} = OLD.{bucket} AND nb_deals = 0;"
+        cur.execute(f"""
+            CREATE TRIGGER trg_{table}_ins AFTER INSERT ON deals BEGIN
+                {_rollup_delta_sql(table, bucket, "NEW", 1)}
+            END
+        """)
+        cur.execute(f"""
+            CREATE TRIGGER trg_{table}_upd AFTER UPDATE ON deals BEGIN
+                {_rollup_delta_sql(table, bucket, "OLD", -1)}
+                {_rollup_delta_sql(table, bucket, "NEW", 1)}
+                {cleanup}
+            END
+        """)
+        cur.execute(f"""
+            CREATE TRIGGER trg_{table}_del AFTER DELETE ON deals BEGIN
+                {_rollup_delta_sql(table, bucket, "OLD", -1)}
+                {cleanup}
+            END
+        """)
+
+        # reconstruction depuis l'historique existant
+        cur.execute(f"DELETE FROM {table}")
+        names = ", ".join(m for m, _ in ROLLUP_MEASURES)
+        sums = ", ".join(f"SUM({expr.format(r='deals')})" for _, expr in ROLLUP_MEASURES)
+        cur.execute(f"""
+            INSERT INTO {table} ({bucket}, symbol, account_id, {names})
+            SELECT {bucket}, COALESCE(symbol, ''), COALESCE(account_id, ''), {sums}
+            FROM deals
+            WHERE {_rollup_condition_sql("deals", bucket)}
+            GROUP BY 1, 2, 3
+        """)
+
+
+def _migrate_v3(cur: sqlite3.Cursor) -> None:
+    """
+    Les sorties sans entry_type (NULL) comptent désormais dans le winrate
+    (l'ancien filtre `entry_type IN ('DEAL_ENTRY_OUT', NULL)` ne les voyait
+    jamais) : recrée les triggers et reconstruit les rollups.
+    """
+    _migrate_v2(cur)
+
+
+def _migrate_v4(cur: sqlite3.Cursor) -> None:
+    """État de synchronisation par compte (checkpoint du backfill)."""
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS sync_state (
+            account_id TEXT PRIMARY KEY,
+            backfill_cursor_ms INTEGER,
+            backfill_done INTEGER NOT NULL DEFAULT 0,
+            updated_at INTEGER
+        )
+    """)
+
+
+def _migrate_v5(cur: sqlite3.Cursor) -> None:
+    """
+    Watermark de la sync incrémentale : fin (epoch ms) de la dernière
+    fenêtre récupérée avec succès. Initialisé depuis MAX(time_ms).
+    """
+    if "watermark_ms" not in _table_columns(cur, "sync_state"):
+        cur.execute("ALTER TABLE sync_state ADD COLUMN watermark_ms INTEGER")
+    cur.execute("""
+        UPDATE sync_state SET watermark_ms = (
+            SELECT MAX(time_ms) FROM deals
+            WHERE COALESCE(deals.account_id, '') = sync_state.account_id
+        )
+        WHERE watermark_ms IS NULL AND backfill_done = 1
+    """)
+
+
+def _default_account_id() -> Optional[str]:
+    """Compte auquel rattacher les deals hérités : ACCOUNT_ID, ou le seul de ACCOUNT_IDS."""
+    account = (os.getenv("ACCOUNT_ID") or "").strip()
+    if account:
+        return account
+    accounts = [a.strip() for a in os.getenv("ACCOUNT_IDS", "").split(",") if a.strip()]
+    return accounts[0] if len(accounts) == 1 else None
+
+
+def _attach_orphans(cur: sqlite3.Cursor, account: str) -> int:
+    """
+    Deals hérités (antérieurs au multi-comptes, account_id NULL) rattachés
+    à `account` : sinon invisibles sous ?account=. Les rollups suivent via
+    le trigger UPDATE ; l'état de sync '' est renommé.
+    Retourne le nombre de deals rattachés.
+    """
+    cur.execute("UPDATE deals SET account_id = ? WHERE account_id IS NULL", [account])
+    attached = cur.rowcount
+    cur.execute("UPDATE OR IGNORE sync_state SET account_id = ? WHERE account_id = ''", [account])
+    cur.execute("DELETE FROM sync_state WHERE account_id = ''")
+    return attached
+
+
+def _migrate_v6(cur: sqlite3.Cursor) -> None:
+    """
+    Deals hérités rattachés au compte par défaut. Compte inconnu à la
+    migration (ACCOUNT_ID non défini) : ils restent NULL et seront
+    rattachés à la première synchro du compte (claim_orphan_deals).
+    """
+    account = _default_account_id()
+    if not account:
+        cur.execute("SELECT 1 FROM deals WHERE account_id IS NULL LIMIT 1")
+        if cur.fetchone():
+            logger.warning("⚠ Deals sans compte conservés : rattachés à la première synchro du compte par défaut")
+        return
+    _attach_orphans(cur, account)
 
 
-def _build_params_with_types(base_params: list) -> list:
-    """Ajoute NON_TRADE_TYPES à la liste de paramètres SQL."""
-    return [*base_params, *NON_TRADE_TYPES]
+def _migrate_v7(cur: sqlite3.Cursor) -> None:
+    """
+    Installations existantes : sync_state était vide après la v4, d'où un
+    backfill complet relancé. Une ligne par compte déjà présent dans deals :
+    backfill terminé, checkpoint et watermark à MAX(time_ms) (comme la v5).
+    """
+    cur.execute("""
+        INSERT OR IGNORE INTO sync_state
+            (account_id, backfill_cursor_ms, backfill_done, watermark_ms, updated_at)
+        SELECT COALESCE(account_id, ''), MAX(time_ms), 1, MAX(time_ms), ?
+        FROM deals
+        WHERE time_ms IS NOT NULL
+        GROUP BY COALESCE(account_id, '')
+    """, [int(time.time() * 1000)])
+
+
+def _migrate_v8(cur: sqlite3.Cursor) -> None:
+    """Index ajoutés à DEAL_INDEXES depuis la v1 (keyset (time_ms, id))."""
+    for name, target in DEAL_INDEXES.items():
+        cur.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {target}")
+
+
+# (version, migration) — à compléter en ajoutant (9, _migrate_v9), ...
+MIGRATIONS = (
+    (1, _migrate_v1),
+    (2, _migrate_v2),
+    (3, _migrate_v3),
+    (4, _migrate_v4),
+    (5, _migrate_v5),
+    (6, _migrate_v6),
+    (7, _migrate_v7),
+    (8, _migrate_v8),
+)
+SCHEMA_VERSION = MIGRATIONS[-1][0]
 
 
 # ---------------------------------------------------------------------------
-# SUMMARY ANALYTICS PRO
+# INIT DB + INDEXES (PRO)
 # ---------------------------------------------------------------------------
-def summary_from_db(days: int = 30, symbol: Optional[str] = None) -> Dict[str, Any]:
+def init_db():
+    """Initialise la DB : applique les migrations manquantes (idempotent)."""
     conn = get_db_connection()
     cur = conn.cursor()
 
-    from_date = (datetime.utcnow() - timedelta(days=days)).isoformat()
-    base_params: List[Any] = [from_date]
-    symbol_filter = ""
+    cur.execute("PRAGMA user_version")
+    current = cur.fetchone()[0]
+
+    # reconstruction des rollups, index... : grosses transactions
+    with write_cache(conn):
+        for version, migrate in MIGRATIONS:
+            if version <= current:
+                continue
+            # une transaction par migration : DDL + user_version atomiques
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                migrate(cur)
+                cur.execute(f"PRAGMA user_version = {version}")
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            current = version
 
-    if symbol:
-        symbol_filter = "AND symbol = ?"
-        base_params.append(symbol.upper())
-
-    # ---------- PnL global ----------
-    sql_pnl = f"""
-        SELECT 
-          COUNT(*) as nb_deals,
-          SUM(profit) as pnl_total,
-          AVG(profit) as avg_profit
-        FROM deals
-        WHERE time >= ?
-          {symbol_filter}
-          AND profit IS NOT NULL
-          {_trade_type_filter_sql('deals')}
+
+# ---------------------------------------------------------------------------
+# NORMALISATION DU TEMPS (epoch ms + buckets UTC)
+# ---------------------------------------------------------------------------
+def to_epoch_ms(value: Any) -> Optional[int]:
     """
-    params = _build_params_with_types(base_params)
-    cur.execute(sql_pnl, params)
-    row = cur.fetchone()
+    Convertit un temps MetaApi en epoch millisecondes UTC.
+    Accepte datetime (naïf = UTC), ISO texte ('Z', offset, 'T' ou ' ')
+    ou nombre (secondes ou millisecondes).
+    """
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        # < 1e11 → secondes (avant l'an 5000), sinon déjà en ms
+        return int(value * 1000) if value < 1e11 else int(value)
+    if isinstance(value, str):
+        text = value.strip()
+        if text.endswith("Z"):
+            text = text[:-1] + "+00:00"
+        try:
+            value = datetime.fromisoformat(text)
+        except ValueError:
+            return None
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return int(value.timestamp() * 1000)
+    return None
 
-    nb_deals = row["nb_deals"] or 0
-    pnl_total = round(row["pnl_total"], 2) if row["pnl_total"] is not None else 0
-    avg_profit = round(row["avg_profit"], 2) if row["avg_profit"] is not None else 0
 
-    # ---------- Winrate (sorties uniquement) ----------
-    sql_wr = f"""
-        SELECT
-          SUM(CASE WHEN profit > 0 THEN 1 ELSE 0 END) as wins,
-          SUM(CASE WHEN profit <= 0 THEN 1 ELSE 0 END) as losses
-        FROM deals
-        WHERE time >= ?
-          {symbol_filter}
-          AND profit IS NOT NULL
-          AND entry_type IN ('DEAL_ENTRY_OUT', NULL)
-          {_trade_type_filter_sql('deals')}
+def iso_from_ms(ms: int) -> str:
+    """Epoch ms → texte ISO UTC normalisé (2025-01-31T12:34:56.789Z)."""
+    t = time.gmtime(ms // 1000)
+    # formatage % direct : ~2x plus rapide que datetime.strftime (appelé par deal)
+    return "%04d-%02d-%02dT%02d:%02d:%02d.%03dZ" % (t[0], t[1], t[2], t[3], t[4], t[5], ms % 1000)
+
+
+def _window_start_day(days: int) -> str:
+    """Premier jour (UTC, 'YYYY-MM-DD') de la fenêtre "derniers `days` jours"."""
+    return time.strftime("%Y-%m-%d", time.gmtime(time.time() - days * 86400))
+
+
+def _day_start_ms(day: str) -> int:
+    """'YYYY-MM-DD' → epoch ms de minuit UTC."""
+    return calendar.timegm(time.strptime(day, "%Y-%m-%d")) * 1000
+
+
+def window_start_ms(days: int) -> int:
+    """Début (epoch ms, minuit UTC) de la fenêtre "derniers `days` jours" des analytics."""
+    return _day_start_ms(_window_start_day(days))
+
+
+# ---------------------------------------------------------------------------
+# INGESTION EN MASSE DES DEALS (executemany + upsert "si changé")
+# ---------------------------------------------------------------------------
+DEAL_COLUMNS = tuple(c for c, _ in DEAL_SCHEMA)
+
+# Taille max d'un IN (...) : SQLite limite le nombre de paramètres
+_ID_CHUNK = 500
+
+# Deals normalisés gardés en mémoire à la fois pendant une ingestion
+# (les itérables/générateurs sont consommés par paquets de cette taille)
+INGEST_CHUNK_SIZE = int(os.getenv("INGEST_CHUNK_SIZE", "2000"))
+
+
+def _build_upsert_sql() -> str:
+    updatable = [c for c in DEAL_COLUMNS if c != "id"]
+    set_clause = ", ".join(f"{c} = excluded.{c}" for c in updatable)
+    # on ne réécrit la ligne (et ses index) que si une valeur a changé
+    changed = " OR ".join(f"deals.{c} IS NOT excluded.{c}" for c in updatable)
+    return f"""
+        INSERT INTO deals ({", ".join(DEAL_COLUMNS)})
+        VALUES ({", ".join("?" for _ in DEAL_COLUMNS)})
+        ON CONFLICT(id) DO UPDATE SET {set_clause}
+        WHERE {changed}
     """
-    cur.execute(sql_wr, params)
+
+
+_UPSERT_DEAL_SQL = _build_upsert_sql()
+
+
+def _is_normalized_iso(value: Any) -> bool:
+    """Texte déjà au format de iso_from_ms (cas courant des payloads JSON MetaApi)."""
+    return (
+        isinstance(value, str)
+        and len(value) == 24
+        and value[10] == "T"
+        and value[19] == "."
+        and value[23] == "Z"
+    )
+
+
+class DealRecord(tuple):
+    """
+    Deal prêt pour SQLite : un tuple aligné sur DEAL_COLUMNS (aucun dict
+    par instance, passé tel quel à executemany). Seul endroit où les
+    champs camelCase MetaApi sont mappés sur les colonnes de `deals`.
+    Accès par nom : record.id, record.time_ms, record.symbol...
+    Pas de modèle pydantic (pourtant installé avec fastapi) : un objet
+    validé par deal puis reconverti en tuple coûte plus cher à l'ingestion
+    que ce tuple, qui est déjà la ligne attendue par sqlite3.
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def from_metaapi(cls, deal: Dict[str, Any], account_id: Optional[str] = None) -> "DealRecord":
+        """Deal MetaApi (dict camelCase) → DealRecord, en une passe."""
+        g = deal.get
+        raw_time = g("time")
+        time_ms = to_epoch_ms(raw_time)
+        if time_ms is None:
+            iso = None
+        elif _is_normalized_iso(raw_time):
+            iso = raw_time  # évite un re-formatage
+        else:
+            iso = iso_from_ms(time_ms)
+        broker_time = g("brokerTime")
+        return tuple.__new__(cls, (
+            g("id"),
+            account_id,
+            g("platform"),
+            g("type"),
+            iso,
+            time_ms,
+            iso[:10] if iso else None,
+            iso[:7] if iso else None,
+            str(broker_time) if broker_time is not None else None,
+            g("commission"),
+            g("swap"),
+            g("profit"),
+            g("symbol"),
+            g("magic"),
+            g("orderId"),
+            g("positionId"),
+            g("reason"),
+            g("brokerComment"),
+            g("entryType"),
+            g("volume"),
+            g("price"),
+            g("stopLoss"),
+            g("takeProfit"),
+            g("accountCurrencyExchangeRate"),
+        ))
+
+    def to_metaapi(self) -> Dict[str, Any]:
+        """Inverse de from_metaapi (dict camelCase, champs renseignés) : exports / archive."""
+        return {f: v for f, v in zip(_METAAPI_FIELDS, self) if f and v is not None}
+
+    def __repr__(self) -> str:
+        return f"DealRecord(id={self[0]!r}, time={self[4]!r}, symbol={self[12]!r}, profit={self[11]!r})"
+
+
+# champ MetaApi de chaque colonne (None : colonne dérivée, ou compte hors payload)
+_METAAPI_FIELDS = (
+    "id", None, "platform", "type", "time", None, None, None, "brokerTime",
+    "commission", "swap", "profit", "symbol", "magic", "orderId", "positionId",
+    "reason", "brokerComment", "entryType", "volume", "price", "stopLoss",
+    "takeProfit", "accountCurrencyExchangeRate",
+)
+assert len(_METAAPI_FIELDS) == len(DEAL_COLUMNS)
+
+
+# accesseurs par nom de colonne (propriétés en lecture seule, sans stockage)
+for _i, _col in enumerate(DEAL_COLUMNS):
+    setattr(DealRecord, _col, property(operator.itemgetter(_i), doc=f"Colonne deals.{_col}"))
+del _i, _col
+
+
+def _existing_ids(cur: sqlite3.Cursor, ids: List[str]) -> set:
+    """Ids déjà présents en base parmi `ids` (requêtes par paquets)."""
+    found = set()
+    for i in range(0, len(ids), _ID_CHUNK):
+        chunk = ids[i:i + _ID_CHUNK]
+        cur.execute(
+            f"SELECT id FROM deals WHERE id IN ({', '.join('?' for _ in chunk)})",
+            chunk,
+        )
+        found.update(r[0] for r in cur.fetchall())
+    return found
+
+
+def _existing_rows(cur: sqlite3.Cursor, ids: List[str]) -> Dict[str, tuple]:
+    """Lignes déjà présentes en base parmi `ids` : id → tuple aligné sur DEAL_COLUMNS."""
+    found: Dict[str, tuple] = {}
+    for i in range(0, len(ids), _ID_CHUNK):
+        chunk = ids[i:i + _ID_CHUNK]
+        cur.execute(
+            f"SELECT {', '.join(DEAL_COLUMNS)} FROM deals WHERE id IN ({', '.join('?' for _ in chunk)})",
+            chunk,
+        )
+        found.update((r[0], tuple(r)) for r in cur.fetchall())
+    return found
+
+
+def _write_deal_chunk(
+    cur: sqlite3.Cursor,
+    rows: Dict[str, DealRecord],
+    stats: Dict[str, int],
+    changed_ids: Optional[List[str]] = None,
+) -> int:
+    """
+    Upsert d'un paquet de lignes ; met à jour `stats`, retourne le nb de
+    lignes modifiées. Si `changed_ids` est fourni, y ajoute les ids insérés
+    ou réellement modifiés (lignes existantes relues pour comparaison).
+    """
+    if changed_ids is None:
+        existing = _existing_ids(cur, list(rows))
+    else:
+        existing = _existing_rows(cur, list(rows))
+        changed_ids.extend(i for i, record in rows.items() if existing.get(i) != tuple(record))
+    cur.executemany(_UPSERT_DEAL_SQL, rows.values())
+    # rowcount = lignes réellement insérées ou modifiées
+    changed = cur.rowcount
+
+    inserted = len(rows) - len(existing)
+    stats["inserted"] += inserted
+    stats["updated"] += changed - inserted
+    stats["unchanged"] += len(rows) - changed
+    return changed
+
+
+def ingest_deals(
+    deals,
+    account_id: Optional[str] = None,
+    on_changed: Optional[Callable[[List[Any]], None]] = None,
+) -> Dict[str, int]:
+    """
+    Écrit des deals MetaApi (liste OU itérable/générateur) en une seule transaction.
+    - normalise chaque dict en DealRecord (déjà DealRecord : utilisé tel quel,
+      `account_id` ignoré ; deals invalides ignorés)
+    - consomme l'itérable par paquets de INGEST_CHUNK_SIZE : la mémoire
+      reste bornée quelle que soit la taille de l'historique
+    - executemany + INSERT ... ON CONFLICT(id) DO UPDATE ... WHERE (changé)
+    - `on_changed(deals)` : appelé par paquet, dans la transaction, avec les
+      deals d'entrée (tels que reçus) insérés ou modifiés — pas les inchangés
+    Retourne {"inserted", "updated", "unchanged", "skipped"}.
+    """
+    stats = {"inserted": 0, "updated": 0, "unchanged": 0, "skipped": 0}
+    rows: Dict[str, DealRecord] = {}
+    raws: Dict[str, Any] = {}
+    changed = 0
+
+    def write_chunk() -> int:
+        if on_changed is None:
+            return _write_deal_chunk(cur, rows, stats)
+        changed_ids: List[str] = []
+        count = _write_deal_chunk(cur, rows, stats, changed_ids)
+        if changed_ids:
+            on_changed([raws[i] for i in changed_ids])
+        return count
+
+    conn = get_db_connection()
+    with write_cache(conn), conn:  # commit si OK, rollback sinon
+        cur = conn.cursor()
+        for deal in deals or []:
+            if isinstance(deal, DealRecord):
+                record = deal
+            elif isinstance(deal, dict) and deal.get("id"):
+                record = DealRecord.from_metaapi(deal, account_id)
+            else:
+                stats["skipped"] += 1
+                continue
+            if not record[0]:
+                stats["skipped"] += 1
+                continue
+            # dernier gagnant si un même id apparaît plusieurs fois
+            rows[record[0]] = record
+            if on_changed is not None:
+                raws[record[0]] = deal
+            if len(rows) >= INGEST_CHUNK_SIZE:
+                changed += write_chunk()
+                rows, raws = {}, {}
+        if rows:
+            changed += write_chunk()
+
+    if changed:
+        bump_data_generation(rewrite=stats["updated"] > 0)
+    return stats
+
+
+def iter_deal_records(account_id: str) -> Iterator[DealRecord]:
+    """Deals d'un compte (DealRecord, triés par temps), lus dans un seul instantané."""
+    with read_snapshot() as conn:
+        cur = conn.cursor()
+        cur.row_factory = None  # tuples bruts
+        cur.execute(
+            f"SELECT {', '.join(DEAL_COLUMNS)} FROM deals WHERE account_id = ? ORDER BY time_ms, id",
+            [account_id],
+        )
+        while True:
+            batch = cur.fetchmany(INGEST_CHUNK_SIZE)
+            if not batch:
+                return
+            for row in batch:
+                yield tuple.__new__(DealRecord, row)
+
+
+# ---------------------------------------------------------------------------
+# ÉTAT DE SYNCHRONISATION (par compte)
+# ---------------------------------------------------------------------------
+def claim_orphan_deals(account_id: str) -> int:
+    """
+    Rattache les deals hérités encore sans compte (v6 appliquée sans
+    ACCOUNT_ID) si `account_id` est le compte par défaut. Appelé au début
+    de chaque synchro, avant la lecture de sync_state : l'état '' hérité
+    (backfill terminé) devient celui du compte → pas de backfill complet.
+    Sans orphelin : une seule lecture indexée. Retourne le nombre rattaché.
+    """
+    if not account_id or account_id != _default_account_id():
+        return 0
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute("SELECT 1 FROM deals WHERE account_id IS NULL LIMIT 1")
+    orphans = cur.fetchone() is not None
+    cur.execute("SELECT 1 FROM sync_state WHERE account_id = '' LIMIT 1")
+    if not orphans and cur.fetchone() is None:
+        return 0
+    with conn:
+        attached = _attach_orphans(conn.cursor(), account_id)
+    if attached:
+        bump_data_generation(rewrite=True)
+        logger.info(f"🔗 {attached} deals hérités rattachés au compte {account_id}")
+    return attached
+
+
+def get_sync_state(account_id: str) -> Dict[str, Any]:
+    """Ligne sync_state du compte ({} si jamais synchronisé)."""
+    cur = get_db_connection().cursor()
+    cur.execute("SELECT * FROM sync_state WHERE account_id = ?", [account_id or ""])
     row = cur.fetchone()
-    wins = row["wins"] or 0
-    losses = row["losses"] or 0
-    total_closed = wins + losses
-    winrate = round((wins / total_closed) * 100, 2) if total_closed > 0 else 0
+    return dict(row) if row else {}
 
-    # ---------- Top symbols ----------
-    sql_top = f"""
-        SELECT symbol, COUNT(*) as n, SUM(profit) as pnl
+
+def update_sync_state(account_id: str, **fields: Any) -> None:
+    """Upsert de colonnes de sync_state (ex: backfill_cursor_ms=...)."""
+    fields["updated_at"] = int(time.time() * 1000)
+    names = list(fields)
+    conn = get_db_connection()
+    with conn:
+        conn.execute(
+            f"""
+            INSERT INTO sync_state (account_id, {", ".join(names)})
+            VALUES (?, {", ".join("?" for _ in names)})
+            ON CONFLICT(account_id) DO UPDATE SET
+                {", ".join(f"{n} = excluded.{n}" for n in names)}
+            """,
+            [account_id or "", *fields.values()],
+        )
+
+
+# ---------------------------------------------------------------------------
+# EMPREINTES JOURNALIÈRES (réconciliation DB locale ↔ MetaApi)
+# ---------------------------------------------------------------------------
+_DIGEST_MASK = (1 << 64) - 1
+
+
+def _digest_add(digests: Dict[str, List[int]], day: str, deal_id: str, time_ms: int, profit: Any) -> None:
+    # colonne REAL : un profit entier (0) est relu en 0.0 → même repr des deux côtés
+    if isinstance(profit, int):
+        profit = float(profit)
+    # somme de CRC32 : indépendante de l'ordre, sensible à l'id, l'heure et le profit
+    h = zlib.crc32(f"{deal_id}|{time_ms}|{profit!r}".encode())
+    d = digests.get(day)
+    if d is None:
+        digests[day] = [1, h]
+    else:
+        d[0] += 1
+        d[1] = (d[1] + h) & _DIGEST_MASK
+
+
+def digest_records(records) -> Dict[str, Tuple[int, int]]:
+    """Empreinte par jour UTC {day: (nb deals, checksum)} d'une liste de DealRecord."""
+    digests: Dict[str, List[int]] = {}
+    for r in records:
+        _digest_add(digests, r.day, r.id, r.time_ms, r.profit)
+    return {day: (d[0], d[1]) for day, d in digests.items()}
+
+
+def local_day_digests(account_id: str, from_ms: int, to_ms: int) -> Dict[str, Tuple[int, int]]:
+    """Même empreinte que digest_records, calculée sur la table deals du compte."""
+    cur = get_db_connection().cursor()
+    cur.execute(
+        """
+        SELECT day, id, time_ms, profit
         FROM deals
-        WHERE time >= ?
-          AND profit IS NOT NULL
-          {_trade_type_filter_sql('deals')}
-        GROUP BY symbol
-        ORDER BY pnl DESC
-        LIMIT 5
+        WHERE account_id = ? AND time_ms >= ? AND time_ms <= ?
+        """,
+        [account_id, from_ms, to_ms],
+    )
+    digests: Dict[str, List[int]] = {}
+    for day, deal_id, time_ms, profit in cur:
+        _digest_add(digests, day, deal_id, time_ms, profit)
+    return {day: (d[0], d[1]) for day, d in digests.items()}
+
+
+# ---------------------------------------------------------------------------
+# FILTRES COMMUNS (symbole / compte)
+# ---------------------------------------------------------------------------
+def _scope_sql(
+    symbol: Optional[str] = None, account: Optional[str] = None
+) -> Tuple[str, List[Any]]:
+    """Fragment `AND ...` + paramètres pour filtrer par symbole et/ou compte."""
+    sql = ""
+    params: List[Any] = []
+    if symbol:
+        sql += " AND symbol = ?"
+        params.append(symbol.upper())
+    if account:
+        sql += " AND account_id = ?"
+        params.append(account)
+    return sql, params
+
+
+def list_accounts() -> List[Dict[str, Any]]:
+    """Comptes connus (deals ou sync_state) avec leur état de synchronisation."""
+    cur = get_db_connection().cursor()
+    cur.execute(
+        """
+        SELECT a.account_id,
+               s.backfill_done,
+               s.watermark_ms,
+               s.updated_at
+        FROM (
+            SELECT DISTINCT account_id FROM deal_monthly WHERE account_id != ''
+            UNION
+            SELECT account_id FROM sync_state WHERE account_id != ''
+        ) a
+        LEFT JOIN sync_state s ON s.account_id = a.account_id
+        ORDER BY a.account_id
+        """
+    )
+    return [dict(r) for r in cur.fetchall()]
+
+
+# ---------------------------------------------------------------------------
+# SUMMARY ANALYTICS PRO
+# ---------------------------------------------------------------------------
+@cached_by_generation
+def summary_from_db(
+    days: int = 30, symbol: Optional[str] = None, account: Optional[str] = None
+) -> Dict[str, Any]:
     """
-    # ici on ne filtre pas par symbol (top global)
-    params_top = _build_params_with_types([from_date])
-    cur.execute(sql_top, params_top)
+    Résumé en UN seul passage sur le rollup journalier : la ventilation par
+    symbole donne à la fois les totaux (filtrés ou non), le winrate des
+    sorties et le top symboles (global au compte, sans filtre symbole).
+    """
+    conn = get_db_connection()
+    cur = conn.cursor()
+    account_filter, account_params = _scope_sql(account=account)
 
+    cur.execute(
+        f"""
+        SELECT
+          symbol,
+          SUM(nb_deals) as nb_deals,
+          SUM(pnl) as pnl,
+          SUM(exit_wins) as wins,
+          SUM(exit_losses) as losses
+        FROM deal_daily
+        WHERE day >= ?
+          {account_filter}
+        GROUP BY symbol
+        """,
+        [_window_start_day(days), *account_params],
+    )
+    by_symbol = cur.fetchall()
+
+    symbol_upper = symbol.upper() if symbol else None
+    nb_deals = 0
+    pnl_sum = 0.0
+    wins = 0
+    losses = 0
+
+    for r in by_symbol:
+        if symbol_upper and r["symbol"] != symbol_upper:
+            continue
+        nb_deals += r["nb_deals"] or 0
+        pnl_sum += r["pnl"] or 0.0
+        wins += r["wins"] or 0
+        losses += r["losses"] or 0
+
+    pnl_total = round(pnl_sum, 2)
+    avg_profit = round(pnl_sum / nb_deals, 2) if nb_deals else 0
+    total_closed = wins + losses
+    winrate = round((wins / total_closed) * 100, 2) if total_closed > 0 else 0
+
+    # ---------- Top symbols (top global, sans filtre symbole) ----------
+    ranked = sorted(
+        (r for r in by_symbol if r["symbol"]),
+        key=lambda r: r["pnl"] or 0.0,
+        reverse=True,
+    )
     top_symbols = [
         {
             "symbol": r["symbol"],
-            "nb_deals": r["n"],
+            "nb_deals": r["nb_deals"],
             "pnl": round(r["pnl"], 2) if r["pnl"] is not None else 0,
         }
-        for r in cur.fetchall()
-        if r["symbol"] is not None
+        for r in ranked[:5]
     ]
 
-    conn.close()
-
     return {
         "period_days": days,
-        "symbol_filter": symbol.upper() if symbol else None,
+        "symbol_filter": symbol_upper,
+        "account_filter": account,
         "nb_deals": nb_deals,
         "pnl_total": pnl_total,
         "avg_profit": avg_profit,
@@ -184,35 +1050,30 @@ def summary_from_db(days: int = 30, symbol: Optional[str] = None) -> Dict[str, A
 # ---------------------------------------------------------------------------
 # EQUITY CURVE / PNL BY DAY PRO
 # ---------------------------------------------------------------------------
-def pnl_by_day_from_db(days: int = 30, symbol: Optional[str] = None) -> List[Dict[str, Any]]:
+@cached_by_generation
+def pnl_by_day_from_db(
+    days: int = 30, symbol: Optional[str] = None, account: Optional[str] = None
+) -> List[Dict[str, Any]]:
     conn = get_db_connection()
     cur = conn.cursor()
 
-    from_date = (datetime.utcnow() - timedelta(days=days)).isoformat()
-    base_params: List[Any] = [from_date]
-    symbol_filter = ""
-
-    if symbol:
-        symbol_filter = "AND symbol = ?"
-        base_params.append(symbol.upper())
+    from_day = _window_start_day(days)
+    symbol_filter, scope_params = _scope_sql(symbol, account)
+    params: List[Any] = [from_day, *scope_params]
 
     sql = f"""
-        SELECT 
-            substr(time, 1, 10) as day,
-            SUM(profit) as pnl
-        FROM deals
-        WHERE time >= ?
+        SELECT
+            day,
+            SUM(pnl) as pnl
+        FROM deal_daily
+        WHERE day >= ?
           {symbol_filter}
-          AND profit IS NOT NULL
-          {_trade_type_filter_sql('deals')}
         GROUP BY day
         ORDER BY day ASC
     """
-    params = _build_params_with_types(base_params)
     cur.execute(sql, params)
 
     rows = cur.fetchall()
-    conn.close()
 
     return [
         {
@@ -226,63 +1087,124 @@ def pnl_by_day_from_db(days: int = 30, symbol: Optional[str] = None) -> List[Dic
 # ---------------------------------------------------------------------------
 # LISTE DES DEALS (pour le tableau "Derniers trades")
 # ---------------------------------------------------------------------------
+# Compteurs COUNT(*) mis en cache : (génération, jour de début, symbole, compte) → total
+# (lu / écrit depuis les threads du serveur : accès sous _generation_lock)
+_count_cache: Dict[tuple, int] = {}
+_COUNT_CACHE_MAX = 256
+
+
+def encode_deals_cursor(time_ms: int, deal_id: str) -> str:
+    """Curseur opaque de pagination keyset sur (time_ms, id)."""
+    raw = f"{time_ms}:{deal_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_deals_cursor(cursor: str) -> tuple:
+    """Inverse de encode_deals_cursor ; ValueError si le curseur est invalide."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        time_ms, deal_id = base64.urlsafe_b64decode(padded).decode().split(":", 1)
+        return int(time_ms), deal_id
+    except Exception as e:
+        raise ValueError(f"Curseur invalide: {cursor}") from e
+
+
+def _count_deals(
+    cur: sqlite3.Cursor, from_day: str, symbol: Optional[str], account: Optional[str] = None
+) -> int:
+    """COUNT(*) de la fenêtre, recalculé seulement si les données ont changé."""
+    key = (get_data_generation(), from_day, symbol, account)
+    with _generation_lock:
+        total = _count_cache.get(key)
+    if total is not None:
+        return total
+
+    symbol_filter, scope_params = _scope_sql(symbol, account)
+    params: List[Any] = [_day_start_ms(from_day), *scope_params]
+
+    cur.execute(
+        f"SELECT COUNT(*) as total FROM deals WHERE time_ms >= ? {symbol_filter}",
+        params,
+    )
+    total = cur.fetchone()["total"]
+
+    with _generation_lock:
+        if len(_count_cache) >= _COUNT_CACHE_MAX:
+            _count_cache.clear()
+        _count_cache[key] = total
+    return total
+
+
+@cached_by_generation
 def list_deals_from_db(
     days: int = 30,
     symbol: Optional[str] = None,
     limit: int = 100,
     offset: int = 0,
+    cursor: Optional[str] = None,
+    account: Optional[str] = None,
 ) -> Dict[str, Any]:
+    """
+    Deals les plus récents d'abord.
+    - `cursor` (keyset sur time_ms, id) : coût constant quelle que soit la page
+    - `offset` : conservé pour compatibilité (ignoré si `cursor` est fourni)
+    """
     conn = get_db_connection()
     cur = conn.cursor()
 
-    from_date = (datetime.utcnow() - timedelta(days=days)).isoformat()
-    params: List[Any] = [from_date]
-    symbol_filter = ""
+    from_day = _window_start_day(days)
+    symbol_upper = symbol.upper() if symbol else None
+    filters, scope_params = _scope_sql(symbol_upper, account)
+    params: List[Any] = [_day_start_ms(from_day), *scope_params]
 
-    if symbol:
-        symbol_filter = "AND symbol = ?"
-        params.append(symbol.upper())
+    if cursor:
+        after_ms, after_id = decode_deals_cursor(cursor)
+        filters += " AND (time_ms, id) < (?, ?)"
+        params.extend([after_ms, after_id])
+        offset = 0
 
-    # total pour pagination
-    cur.execute(
-        f"SELECT COUNT(*) as total FROM deals WHERE time >= ? {symbol_filter}",
-        params,
-    )
-    total = cur.fetchone()["total"]
+    # total pour pagination (mis en cache par génération)
+    total = _count_deals(cur, from_day, symbol_upper, account)
 
     # liste paginée
     cur.execute(
         f"""
-        SELECT id, platform, type, symbol, time, broker_time,
+        SELECT id, account_id, platform, type, symbol, time, time_ms, broker_time,
                volume, price, profit, entry_type, reason,
                order_id, position_id, stop_loss, take_profit,
                broker_comment, account_currency_exchangeRate
         FROM deals
-        WHERE time >= ?
-          {symbol_filter}
-        ORDER BY time DESC
+        WHERE time_ms >= ?
+          {filters}
+        ORDER BY time_ms DESC, id DESC
         LIMIT ? OFFSET ?
         """,
         params + [limit, offset],
     )
 
-    rows = cur.fetchall()
-    conn.close()
+    items = [dict(r) for r in cur.fetchall()]
+    next_cursor = None
+    if len(items) == limit:
+        last = items[-1]
+        next_cursor = encode_deals_cursor(last["time_ms"], last["id"])
 
     return {
         "total": total,
         "limit": limit,
         "offset": offset,
-        "items": [dict(r) for r in rows],
+        "next_cursor": next_cursor,
+        "items": items,
     }
 
 
 # ---------------------------------------------------------------------------
 # DRAWDOWN (courbe equity + drawdown %)
 # ---------------------------------------------------------------------------
+@cached_by_generation
 def drawdown_from_db(
     days: int = 30,
     symbol: Optional[str] = None,
+    account: Optional[str] = None,
 ) -> Dict[str, Any]:
     """
     Calcule la courbe de drawdown à partir de la PNL journalière.
@@ -294,8 +1216,14 @@ def drawdown_from_db(
       "max_drawdown": -12.34
     }
     """
-    daily = pnl_by_day_from_db(days=days, symbol=symbol)
+    daily = pnl_by_day_from_db(days=days, symbol=symbol, account=account)
+    return _drawdown_from_daily(daily, days, symbol, account)
 
+
+def _drawdown_from_daily(
+    daily: List[Dict[str, Any]], days: int, symbol: Optional[str], account: Optional[str]
+) -> Dict[str, Any]:
+    """Courbe equity + drawdown % à partir d'une PNL journalière déjà calculée."""
     equity: List[float] = []
     dd: List[float] = []
     running_equity = 0.0
@@ -330,6 +1258,7 @@ def drawdown_from_db(
     return {
         "period_days": days,
         "symbol_filter": symbol.upper() if symbol else None,
+        "account_filter": account,
         "items": items,
         "max_drawdown": round(max_drawdown, 2),
     }
@@ -338,9 +1267,11 @@ def drawdown_from_db(
 # ---------------------------------------------------------------------------
 # PNL MENSUELLE
 # ---------------------------------------------------------------------------
+@cached_by_generation
 def monthly_performance_from_db(
     days: int = 180,
     symbol: Optional[str] = None,
+    account: Optional[str] = None,
 ) -> Dict[str, Any]:
     """
     PNL agrégé par mois.
@@ -356,31 +1287,35 @@ def monthly_performance_from_db(
     conn = get_db_connection()
     cur = conn.cursor()
 
-    from_date = (datetime.utcnow() - timedelta(days=days)).isoformat()
-    base_params: List[Any] = [from_date]
-    symbol_filter = ""
-
-    if symbol:
-        symbol_filter = "AND symbol = ?"
-        base_params.append(symbol.upper())
+    from_day = _window_start_day(days)
+    from_month = from_day[:7]
+    symbol_filter, symbol_params = _scope_sql(symbol, account)
 
+    # mois complets → rollup mensuel ; 1er mois (partiel) → rollup journalier
     sql = f"""
-        SELECT
-            substr(time, 1, 7) as month,
-            SUM(profit) as pnl
-        FROM deals
-        WHERE time >= ?
-          {symbol_filter}
-          AND profit IS NOT NULL
-          {_trade_type_filter_sql('deals')}
+        SELECT month, SUM(pnl) as pnl
+        FROM (
+            SELECT month, pnl
+            FROM deal_monthly
+            WHERE month > ?
+              {symbol_filter}
+            UNION ALL
+            SELECT substr(day, 1, 7) as month, pnl
+            FROM deal_daily
+            WHERE day >= ? AND day < ?
+              {symbol_filter}
+        )
         GROUP BY month
         ORDER BY month ASC
     """
 
-    params: List[Any] = _build_params_with_types(base_params)
+    # borne haute du 1er mois : 'YYYY-MM' + '~' > tout 'YYYY-MM-DD' du mois
+    params: List[Any] = [
+        from_month, *symbol_params,
+        from_day, from_month + "~", *symbol_params,
+    ]
     cur.execute(sql, params)
     rows = cur.fetchall()
-    conn.close()
 
     items = []
     for r in rows:
@@ -391,6 +1326,7 @@ def monthly_performance_from_db(
     return {
         "period_days": days,
         "symbol_filter": symbol.upper() if symbol else None,
+        "account_filter": account,
         "items": items,
     }
 
@@ -398,9 +1334,11 @@ def monthly_performance_from_db(
 # ---------------------------------------------------------------------------
 # STATS PAR SYMBOLE
 # ---------------------------------------------------------------------------
+@cached_by_generation
 def symbol_stats_from_db(
     days: int = 90,
     symbol: Optional[str] = None,
+    account: Optional[str] = None,
 ) -> Dict[str, Any]:
     """
     Stats par symbole:
@@ -416,35 +1354,27 @@ def symbol_stats_from_db(
     conn = get_db_connection()
     cur = conn.cursor()
 
-    from_date = (datetime.utcnow() - timedelta(days=days)).isoformat()
-    base_params: List[Any] = [from_date]
-    symbol_filter = ""
-
-    if symbol:
-        symbol_filter = "AND symbol = ?"
-        base_params.append(symbol.upper())
+    from_day = _window_start_day(days)
+    symbol_filter, scope_params = _scope_sql(symbol, account)
+    params: List[Any] = [from_day, *scope_params]
 
     sql = f"""
         SELECT
             symbol,
-            COUNT(*) as trades,
-            SUM(profit) as pnl,
-            SUM(CASE WHEN profit > 0 THEN 1 ELSE 0 END) as wins,
-            SUM(CASE WHEN profit <= 0 THEN 1 ELSE 0 END) as losses
-        FROM deals
-        WHERE time >= ?
+            SUM(nb_deals) as trades,
+            SUM(pnl) as pnl,
+            SUM(wins) as wins,
+            SUM(losses) as losses
+        FROM deal_daily
+        WHERE day >= ?
           {symbol_filter}
-          AND profit IS NOT NULL
-          {_trade_type_filter_sql('deals')}
+          AND symbol != ''
         GROUP BY symbol
-        HAVING symbol IS NOT NULL
         ORDER BY pnl DESC
     """
 
-    params: List[Any] = _build_params_with_types(base_params)
     cur.execute(sql, params)
     rows = cur.fetchall()
-    conn.close()
 
     items: List[Dict[str, Any]] = []
     for r in rows:
@@ -467,5 +1397,44 @@ def symbol_stats_from_db(
     return {
         "period_days": days,
         "symbol_filter": symbol.upper() if symbol else None,
+        "account_filter": account,
         "items": items,
     }
+
+
+# ---------------------------------------------------------------------------
+# BOOTSTRAP DASHBOARD (tous les panneaux, un seul instantané)
+# ---------------------------------------------------------------------------
+@cached_by_generation
+def dashboard_from_db(
+    days: int = 30,
+    symbol: Optional[str] = None,
+    account: Optional[str] = None,
+    deals_limit: int = 100,
+) -> Dict[str, Any]:
+    """
+    Tous les panneaux du dashboard en un appel : une connexion, une
+    transaction de lecture (instantané cohérent entre panneaux), la PNL
+    journalière calculée une fois et réutilisée pour le drawdown.
+    Les fonctions panneau sont appelées sans leur cache individuel
+    (__wrapped__) : c'est le résultat global qui est mis en cache.
+    """
+    with read_snapshot():
+        daily = pnl_by_day_from_db.__wrapped__(days=days, symbol=symbol, account=account)
+        return {
+            "period_days": days,
+            "symbol_filter": symbol.upper() if symbol else None,
+            "account_filter": account,
+            "summary": summary_from_db.__wrapped__(days=days, symbol=symbol, account=account),
+            "pnl_by_day": daily,
+            "drawdown": _drawdown_from_daily(daily, days, symbol, account),
+            "monthly_performance": monthly_performance_from_db.__wrapped__(
+                days=days, symbol=symbol, account=account
+            ),
+            "symbol_stats": symbol_stats_from_db.__wrapped__(
+                days=days, symbol=symbol, account=account
+            ),
+            "deals": list_deals_from_db.__wrapped__(
+                days=days, symbol=symbol, limit=deals_limit, account=account
+            ),
+        }
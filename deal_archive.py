@@ -0,0 +1,273 @@
+# deal_archive.py – archive brute des deals MetaApi (segments gzip append-only) + replay
+#
+# Arborescence : <DEAL_ARCHIVE_DIR>/<compte>/<start_ms>-<end_ms>-<écrit_ms>.jsonl.gz
+#   (rejoués dans l'ordre d'écriture : chaque segment = deals changés à cet instant)
+#   ligne 1     : en-tête {"account_id", "start_ms", "end_ms"}
+#   lignes 2..n : un deal MetaApi brut par ligne (tel que reçu du RPC)
+# <compte>/.baseline : base posée (deals déjà en DB archivés une fois, ensure_baseline) ;
+#   sans elle, l'archive ne couvre pas l'historique antérieur (replay/stats avertissent)
+#
+# Replay (sans réseau) :
+#   python deal_archive.py replay [--account ID] [--db chemin.db]
+#   python deal_archive.py stats
+import os
+import re
+import sys
+import gzip
+import json
+import time
+import logging
+import argparse
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import dashboard_db as db
+
+logger = logging.getLogger("deal_archive")
+
+ARCHIVE_ENABLED = os.getenv("DEAL_ARCHIVE", "1") not in ("0", "false", "False")
+ARCHIVE_DIR = Path(os.getenv("DEAL_ARCHIVE_DIR", str(db.BASE_DIR / "archive")))
+ARCHIVE_COMPRESSLEVEL = int(os.getenv("DEAL_ARCHIVE_COMPRESSLEVEL", "6"))
+
+_SEGMENT_RE = re.compile(r"^(\d+)-(\d+)-(\d+)\.jsonl\.gz$")
+
+# horodatages d'écriture strictement croissants (ordre de replay sans ex æquo)
+_written_lock = threading.Lock()
+_last_written_ms = 0
+
+
+def _json_default(value: Any) -> Any:
+    # le SDK MetaApi renvoie des datetime : ISO (relu tel quel par to_epoch_ms)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def _account_dir(account_id: str) -> Path:
+    return ARCHIVE_DIR / re.sub(r"[^A-Za-z0-9_.-]", "_", account_id)
+
+
+def _next_written_ms() -> int:
+    global _last_written_ms
+    with _written_lock:
+        _last_written_ms = max(int(time.time() * 1000), _last_written_ms + 1)
+        return _last_written_ms
+
+
+# ---------------------------------------------------------------------------
+# ÉCRITURE : un segment par fenêtre / page synchronisée (deals nouveaux ou modifiés)
+# ---------------------------------------------------------------------------
+class ArchiveSegment:
+    """
+    Segment en cours d'écriture. Les deals insérés ou modifiés sont
+    compressés au fil de l'ingestion (write, rappel on_changed de
+    ingest_deals) : les doublons de l'overlap ne sont pas ré-archivés. Le
+    fichier n'apparaît (rename atomique) qu'en sortie sans erreur, et
+    jamais s'il est vide — une sync sans nouveauté n'écrit rien.
+    """
+
+    def __init__(self, account_id: str, start_ms: int, end_ms: int):
+        self.account_id = account_id
+        self.count = 0
+        directory = _account_dir(account_id)
+        directory.mkdir(parents=True, exist_ok=True)
+        name = f"{int(start_ms):013d}-{int(end_ms):013d}-{_next_written_ms():013d}.jsonl.gz"
+        self.path = directory / name
+        self._tmp = directory / f".{name}.tmp"
+        self._file = gzip.open(self._tmp, "wt", encoding="utf-8", compresslevel=ARCHIVE_COMPRESSLEVEL)
+        self._write({"account_id": account_id, "start_ms": int(start_ms), "end_ms": int(end_ms)})
+
+    def _write(self, obj: Any) -> None:
+        self._file.write(json.dumps(obj, default=_json_default, separators=(",", ":")))
+        self._file.write("\n")
+
+    def write(self, deals: Iterable[Any]) -> None:
+        """Archive les deals dict (bruts, tels que reçus du RPC)."""
+        for deal in deals:
+            if isinstance(deal, dict):
+                self._write(deal)
+                self.count += 1
+
+    def __enter__(self) -> "ArchiveSegment":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self._file.close()
+        if exc_type is None and self.count:
+            os.replace(self._tmp, self.path)
+        else:
+            self._tmp.unlink(missing_ok=True)
+
+
+def open_segment(account_id: str, start_ms: int, end_ms: int) -> ArchiveSegment:
+    return ArchiveSegment(account_id, start_ms, end_ms)
+
+
+# ---------------------------------------------------------------------------
+# BASE DE L'ARCHIVE : instantané des deals déjà en DB (une fois par compte)
+# ---------------------------------------------------------------------------
+BASELINE_MARKER = ".baseline"
+
+
+def has_baseline(account_id: str) -> bool:
+    """L'archive du compte couvre-t-elle tout son historique (base posée) ?"""
+    return (_account_dir(account_id) / BASELINE_MARKER).exists()
+
+
+def ensure_baseline(account_id: str) -> int:
+    """
+    Seuls les deals nouveaux ou modifiés sont archivés : l'historique déjà en
+    DB quand l'archive démarre (installation existante, backfill marqué
+    terminé par la migration v7) n'y serait jamais. Au premier appel pour un
+    compte, ses deals en DB sont écrits dans un segment de base (repris dans
+    l'ordre d'écriture comme les autres), puis le marqueur est posé. DB vide
+    pour ce compte : marqueur seul (tout ce qui arrivera sera archivé).
+    Retourne le nombre de deals archivés.
+    """
+    if not ARCHIVE_ENABLED or has_baseline(account_id):
+        return 0
+    with open_segment(account_id, 0, int(time.time() * 1000)) as segment:
+        segment.write(record.to_metaapi() for record in db.iter_deal_records(account_id))
+    (_account_dir(account_id) / BASELINE_MARKER).touch()
+    if segment.count:
+        logger.info(f"🗄 [{account_id}] Base de l'archive : {segment.count} deals existants archivés")
+    return segment.count
+
+
+# ---------------------------------------------------------------------------
+# LECTURE / REPLAY
+# ---------------------------------------------------------------------------
+def list_segments(account_id: Optional[str] = None) -> List[Path]:
+    """
+    Segments triés par (compte, écriture) : ordre de replay. Un segment ne
+    contient que les deals changés au moment où il est écrit (journal en
+    ajout seul) : une réparation de la réconciliation, dont la fenêtre
+    commence plus tôt, doit passer APRÈS les segments écrits avant elle.
+    """
+    if account_id:
+        dirs = [_account_dir(account_id)]
+    elif ARCHIVE_DIR.is_dir():
+        dirs = sorted(p for p in ARCHIVE_DIR.iterdir() if p.is_dir())
+    else:
+        dirs = []
+
+    segments: List[Path] = []
+    for directory in dirs:
+        if not directory.is_dir():
+            continue
+        found = [(m, p) for p in directory.iterdir() if (m := _SEGMENT_RE.match(p.name))]
+        found.sort(key=lambda mp: (int(mp[0].group(3)), int(mp[0].group(1))))
+        segments.extend(p for _, p in found)
+    return segments
+
+
+def read_segment(path: Path) -> tuple:
+    """
+    (en-tête, itérateur des deals bruts) d'un segment. Le fichier des deals
+    n'est ouvert qu'à l'itération (et refermé à sa fin ou à sa destruction) :
+    rien ne fuit si l'itérateur n'est pas consommé.
+    """
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        header = json.loads(f.readline())
+
+    def deals() -> Iterator[Dict[str, Any]]:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            f.readline()  # en-tête
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    return header, deals()
+
+
+def replay(account_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Ré-ingère l'archive dans la DB courante (db.DB_PATH), sans réseau.
+    Upsert "si changé" : rejouable à volonté, remplit les colonnes ajoutées
+    par une migration, ou reconstruit une DB neuve (--db nouveau.db).
+    `incomplete` : comptes sans base d'archive (reconstruction partielle).
+    """
+    db.init_db()
+    totals: Dict[str, Any] = {"segments": 0, "deals": 0, "inserted": 0, "updated": 0, "unchanged": 0}
+    totals["incomplete"] = _accounts_without_baseline(account_id)
+
+    for path in list_segments(account_id):
+        header, deals = read_segment(path)
+        stats = db.ingest_deals(deals, account_id=header["account_id"])
+        totals["segments"] += 1
+        totals["deals"] += stats["inserted"] + stats["updated"] + stats["unchanged"]
+        for k in ("inserted", "updated", "unchanged"):
+            totals[k] += stats[k]
+
+    return totals
+
+
+def _accounts_without_baseline(account_id: Optional[str] = None) -> List[str]:
+    """Répertoires de comptes archivés sans base : historique antérieur absent."""
+    if account_id:
+        dirs = [_account_dir(account_id)]
+    elif ARCHIVE_DIR.is_dir():
+        dirs = sorted(p for p in ARCHIVE_DIR.iterdir() if p.is_dir())
+    else:
+        dirs = []
+    return [d.name for d in dirs if d.is_dir() and not (d / BASELINE_MARKER).exists()]
+
+
+def archive_stats() -> Dict[str, Any]:
+    accounts: Dict[str, Dict[str, Any]] = {}
+    for path in list_segments():
+        acc = accounts.setdefault(path.parent.name, {"segments": 0, "bytes": 0})
+        acc["segments"] += 1
+        acc["bytes"] += path.stat().st_size
+    incomplete = _accounts_without_baseline()
+    for name, acc in accounts.items():
+        acc["baseline"] = name not in incomplete
+    return {"archive_dir": str(ARCHIVE_DIR), "accounts": accounts, "incomplete": incomplete}
+
+
+def _warn_incomplete(accounts: List[str]) -> None:
+    for name in accounts:
+        logger.warning(
+            f"⚠ Archive incomplète pour {name} : pas de base ({BASELINE_MARKER}), "
+            f"les deals antérieurs à l'archive n'y sont pas — une DB reconstruite sera partielle"
+        )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Archive brute des deals MetaApi")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_replay = sub.add_parser("replay", help="reconstruit / migre la table deals depuis l'archive")
+    p_replay.add_argument("--account", help="un seul compte (défaut : tous)")
+    p_replay.add_argument("--db", help="DB cible (défaut : trades.db) ; une DB neuve = rebuild complet")
+    sub.add_parser("stats", help="taille de l'archive par compte")
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    if args.command == "stats":
+        stats = archive_stats()
+        _warn_incomplete(stats["incomplete"])
+        print(json.dumps(stats, indent=2))
+        return 0
+
+    if args.db:
+        db.DB_PATH = Path(args.db)
+
+    t0 = time.perf_counter()
+    totals = replay(args.account)
+    elapsed = time.perf_counter() - t0
+    logger.info(
+        f"✔ Replay terminé : {totals['deals']} deals depuis {totals['segments']} segments "
+        f"en {elapsed:.1f}s ({totals['inserted']} insérés / {totals['updated']} mis à jour)"
+    )
+    db.close_all_connections()
+    # reconstruction partielle : signalée et code de sortie ≠ 0
+    _warn_incomplete(totals["incomplete"])
+    return 1 if totals["incomplete"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
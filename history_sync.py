@@ -1,169 +1,702 @@
 # history_sync.py – SIMPLE, STABLE, RPC-ONLY (Option 1)
+import os
+import re
 import json
+import time
 import logging
 import asyncio
+import threading
+from collections import deque
 from datetime import datetime
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
 
 import dashboard_db as db
+import deal_archive
 from metaapi_client import MetaApiClient
 
 logger = logging.getLogger("history_sync")
 
+# Taille de page RPC (MetaApi plafonne get_deals_by_time_range à 1000 deals)
+RPC_PAGE_LIMIT = 1000
+
+# Backfill fenêtré : début de l'historique + bornes des fenêtres adaptatives
+BACKFILL_START = os.getenv("HISTORY_BACKFILL_START", "2000-01-01")
+BACKFILL_INITIAL_WINDOW_DAYS = float(os.getenv("HISTORY_BACKFILL_WINDOW_DAYS", "30"))
+BACKFILL_MIN_WINDOW_MS = 3600 * 1000             # 1 heure
+BACKFILL_MAX_WINDOW_MS = 365 * 86400 * 1000      # 1 an
+# nombre de deals visé par fenêtre (la fenêtre grandit/rétrécit autour)
+BACKFILL_TARGET_DEALS = int(os.getenv("HISTORY_BACKFILL_TARGET_DEALS", "500"))
+# fenêtres téléchargées en parallèle + plafond d'appels RPC par seconde
+BACKFILL_CONCURRENCY = int(os.getenv("HISTORY_BACKFILL_CONCURRENCY", "4"))
+RPC_MAX_PER_SECOND = float(os.getenv("METAAPI_RPC_MAX_PER_SECOND", "5"))
+RPC_MAX_RETRIES = 5
+
+# Sync incrémentale : on relit [watermark - overlap, maintenant] pour
+# rattraper les deals arrivés en retard / de même timestamp (dédup par id)
+SYNC_OVERLAP_SECONDS = int(os.getenv("SYNC_OVERLAP_SECONDS", "300"))
+
+# Réconciliation : empreintes journalières comparées sur un horizon glissant
+RECONCILE_HORIZON_DAYS = int(os.getenv("RECONCILE_HORIZON_DAYS", "7"))
+RECONCILE_INTERVAL_SECONDS = int(os.getenv("RECONCILE_INTERVAL_SECONDS", str(6 * 3600)))
+
+# Polling de secours (quand aucun événement n'arrive) : l'intervalle double à
+# chaque sync vide jusqu'au plafond, et revient au minimum dès qu'il y a de l'activité
+INCREMENTAL_SYNC_MIN_INTERVAL = float(os.getenv("INCREMENTAL_SYNC_INTERVAL", "60"))
+INCREMENTAL_SYNC_MAX_INTERVAL = float(os.getenv("INCREMENTAL_SYNC_MAX_INTERVAL", "900"))
+# délai de regroupement après un événement (un ordre = plusieurs événements)
+SYNC_EVENT_DEBOUNCE_SECONDS = float(os.getenv("SYNC_EVENT_DEBOUNCE_SECONDS", "2"))
+
+
+def _utc_from_ms(ms: int) -> datetime:
+    """Epoch ms → datetime UTC naïf (format attendu par le SDK MetaApi)."""
+    return datetime.utcfromtimestamp(ms / 1000)
+
+
+class RpcRateLimiter:
+    """
+    Espace les appels RPC (au plus `max_per_second`) sur une boucle asyncio.
+    Pas de verrou : lecture/écriture de _next sans await entre les deux.
+    """
+
+    def __init__(self, max_per_second: float):
+        self.interval = 1.0 / max_per_second if max_per_second > 0 else 0.0
+        self._next = 0.0
+
+    async def wait(self):
+        now = asyncio.get_running_loop().time()
+        slot = max(now, self._next)
+        self._next = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+def _is_rate_limited(error: Exception) -> bool:
+    # TooManyRequestsException du SDK MetaApi (détectée par nom : chemin d'import variable)
+    return type(error).__name__ == "TooManyRequestsException"
+
+
+def _retry_delay(error: Exception, attempt: int) -> float:
+    """Délai avant retry : recommandé par MetaApi si fourni, sinon exponentiel."""
+    metadata = getattr(error, "metadata", None) or {}
+    recommended = metadata.get("recommendedRetryTime") if isinstance(metadata, dict) else None
+    if recommended:
+        delay = (db.to_epoch_ms(recommended) or 0) / 1000 - time.time()
+        if delay > 0:
+            return delay
+    return min(2 ** attempt, 60)
+
 
 # ---------------------------------------------------------
 # FETCH RPC DEALS — Version stable, filtrage anti-chaînes
 # ---------------------------------------------------------
-async def fetch_rpc_deals(start, end, client):
+_JSON_DECODER = json.JSONDecoder()
+_JSON_WS = re.compile(r"[ \t\n\r]*")
+
+
+def _iter_json_array(text: str, idx: int) -> Iterator[Any]:
+    """Décode un à un les éléments du tableau JSON qui commence à text[idx] == '['."""
+    raw_decode = _JSON_DECODER.raw_decode
+    idx = _JSON_WS.match(text, idx + 1).end()
+    if text.startswith("]", idx):
+        return
+    while True:
+        item, idx = raw_decode(text, idx)
+        yield item
+        idx = _JSON_WS.match(text, idx).end()
+        sep = text[idx:idx + 1]
+        if sep == "]":
+            return
+        if sep != ",":
+            raise ValueError(f"',' ou ']' attendu à la position {idx}")
+        idx = _JSON_WS.match(text, idx + 1).end()
+
+
+def _iter_json_deals(text: str) -> Iterator[Any]:
     """
-    Récupère les deals via RPC (get_deals_by_time_range)
-    et les normalise en une liste Python de deals dict.
-    Compatible avec mt_bot.py.
+    Décodage incrémental (json.JSONDecoder.raw_decode) d'une réponse RPC
+    texte : `[...]` ou `{"deals": [...], ...}`. Les deals sont produits un
+    par un, la liste complète de dicts n'existe jamais en mémoire.
     """
+    idx = _JSON_WS.match(text).end()
+    head = text[idx:idx + 1]
 
-    try:
-        # Appel RPC officiel (la seule bonne méthode)
-        raw = await client.connection.get_deals_by_time_range(
-            start_time=start,
-            end_time=end
-        )
+    if head == "[":
+        yield from _iter_json_array(text, idx)
+        return
+
+    if head != "{":
+        value, _ = _JSON_DECODER.raw_decode(text, idx)
+        logger.warning(f"⚠ Format RPC inattendu: {type(value)} → {value}")
+        return
+
+    # objet : on parcourt les clés de premier niveau jusqu'à "deals"
+    idx = _JSON_WS.match(text, idx + 1).end()
+    while not text.startswith("}", idx):
+        key, idx = _JSON_DECODER.raw_decode(text, idx)
+        idx = _JSON_WS.match(text, idx).end()
+        if not text.startswith(":", idx):
+            raise ValueError(f"':' attendu à la position {idx}")
+        idx = _JSON_WS.match(text, idx + 1).end()
+
+        if key == "deals" and text.startswith("[", idx):
+            yield from _iter_json_array(text, idx)
+            return
+
+        _, idx = _JSON_DECODER.raw_decode(text, idx)  # autre clé : ignorée
+        idx = _JSON_WS.match(text, idx).end()
+        if text.startswith(",", idx):
+            idx = _JSON_WS.match(text, idx + 1).end()
+
+    logger.warning("⚠ Format RPC inattendu: objet JSON sans clé 'deals'")
+
+
+def iter_rpc_deals(raw) -> Iterator[Dict[str, Any]]:
+    """
+    MetaApi RPC renvoie PARFOIS :
+    - un dict python déjà propre ({"deals": [...]})
+    - une liste de deals
+    - une string JSON (selon transport WebSocket) → décodée au fil de l'eau
+    Lève ValueError si la string JSON est invalide.
+    """
+    if isinstance(raw, (str, bytes, bytearray)):
+        text = raw if isinstance(raw, str) else bytes(raw).decode("utf-8")
+        try:
+            yield from _iter_json_deals(text)
+        except ValueError as err:  # JSONDecodeError hérite de ValueError
+            raise ValueError(f"JSON RPC invalide : {err}") from err
+        return
+
+    # LOGIQUE IDENTIQUE À mt_bot.py
+    if isinstance(raw, dict) and "deals" in raw:
+        yield from raw["deals"] or []
+
+    elif isinstance(raw, list):
+        yield from raw
+
+    else:
+        logger.warning(f"⚠ Format RPC inattendu: {type(raw)} → {raw}")
+
+
+def _normalize_rpc_deals(raw) -> List[Dict[str, Any]]:
+    """Version liste de iter_rpc_deals (fetch_rpc_window, réconciliation)."""
+    return list(iter_rpc_deals(raw))
+
+
+class _CountingIter:
+    """Itérateur qui compte les éléments produits (pagination sans liste)."""
 
-        # MetaApi RPC renvoie PARFOIS :
-        # - un dict python déjà propre
-        # - une string JSON (selon transport WebSocket)
-        if isinstance(raw, str):
-            try:
-                raw = json.loads(raw)
-            except Exception as err:
-                logger.error(f"❌ JSON RPC invalide : {err} → raw={raw}")
-                return []
+    __slots__ = ("_it", "count")
 
-        # LOGIQUE IDENTIQUE À mt_bot.py
-        if isinstance(raw, dict) and "deals" in raw:
-            return raw["deals"]
+    def __init__(self, iterable):
+        self._it = iter(iterable)
+        self.count = 0
 
-        elif isinstance(raw, list):
-            return raw
+    def __iter__(self):
+        return self
 
-        else:
-            logger.warning(f"⚠ Format RPC inattendu: {type(raw)} → {raw}")
-            return []
+    def __next__(self):
+        item = next(self._it)
+        self.count += 1
+        return item
+
+
+async def _get_deals_page(start, end, client, offset, limiter):
+    """Un appel get_deals_by_time_range, limité en débit, avec retry si 429."""
+    attempt = 0
+    while True:
+        if limiter:
+            await limiter.wait()
+        try:
+            return await client.connection.get_deals_by_time_range(
+                start_time=start,
+                end_time=end,
+                offset=offset,
+                limit=RPC_PAGE_LIMIT,
+            )
+        except Exception as e:
+            if not _is_rate_limited(e) or attempt >= RPC_MAX_RETRIES:
+                raise
+            delay = _retry_delay(e, attempt)
+            logger.warning(f"⏳ MetaApi rate limit — retry dans {delay:.1f}s")
+            await asyncio.sleep(delay)
+            attempt += 1
+
+
+async def fetch_rpc_window(
+    start, end, client, limiter: Optional[RpcRateLimiter] = None
+) -> List[Dict[str, Any]]:
+    """
+    Récupère TOUS les deals de [start, end] en paginant (offset/limit).
+    Lève l'exception en cas d'échec RPC : l'appelant décide (retry, checkpoint).
+    """
+    deals: List[Dict[str, Any]] = []
+    offset = 0
 
+    while True:
+        raw = await _get_deals_page(start, end, client, offset, limiter)
+        page = _normalize_rpc_deals(raw)
+        deals.extend(page)
+
+        if len(page) < RPC_PAGE_LIMIT:
+            return deals
+        offset += RPC_PAGE_LIMIT
+
+
+async def stream_rpc_window(
+    start, end, client, limiter: Optional[RpcRateLimiter] = None, first_page=None
+) -> AsyncIterator[Iterator[Dict[str, Any]]]:
+    """
+    Variante streaming de fetch_rpc_window : produit chaque page sous forme
+    d'itérateur de deals décodés au fil de l'eau. Le consommateur DOIT
+    épuiser la page avant de demander la suivante (sert à la pagination).
+    `first_page` : réponse RPC brute de l'offset 0 déjà téléchargée (backfill).
+    """
+    offset = 0
+    raw = first_page
+
+    while True:
+        if raw is None:
+            raw = await _get_deals_page(start, end, client, offset, limiter)
+        page = _CountingIter(iter_rpc_deals(raw))
+        yield page
+        raw = None
+
+        if page.count < RPC_PAGE_LIMIT:
+            return
+        offset += RPC_PAGE_LIMIT
+
+
+async def fetch_rpc_deals(start, end, client):
+    """
+    Récupère les deals via RPC (get_deals_by_time_range)
+    et les normalise en une liste Python de deals dict.
+    Compatible avec mt_bot.py. Ne lève jamais : [] en cas d'erreur.
+    """
+    try:
+        return await fetch_rpc_window(start, end, client)
     except Exception as e:
         logger.error(f"❌ RPC fetch failed: {e}")
         return []
-    
+
 
 # ---------------------------------------------------------
 # SAVE IN DB
 # ---------------------------------------------------------
-def save_deals_to_db(deals):
-    conn = db.get_db_connection()
-    cur = conn.cursor()
-    inserted = 0
+def save_deals_to_db(deals, account_id=None, window: Optional[tuple] = None):
+    """
+    Ingestion en masse (une transaction, upsert uniquement si changé).
+    Si `window` = (start_ms, end_ms) est fourni, les deals bruts insérés ou
+    modifiés sont aussi archivés au passage dans un segment gzip (voir
+    deal_archive) — le segment n'est conservé que si l'ingestion réussit
+    et s'il contient au moins un deal.
+    Retourne les compteurs {"inserted", "updated", "unchanged", "skipped"}.
+    """
+    if window is not None and account_id and deal_archive.ARCHIVE_ENABLED:
+        with deal_archive.open_segment(account_id, *window) as segment:
+            stats = db.ingest_deals(deals, account_id=account_id, on_changed=segment.write)
+    else:
+        stats = db.ingest_deals(deals, account_id=account_id)
+    if stats["skipped"]:
+        logger.warning(f"{stats['skipped']} deals ignorés (non dict ou sans id)")
+    return stats
 
-    for deal in deals:
-        if not isinstance(deal, dict):
-            logger.warning(f"Deal non dict ignoré: {deal}")
-            continue
 
-        deal_id = deal.get("id")
-        if not deal_id:
-            logger.warning(f"Deal sans id ignoré: {deal}")
-            continue
+# ---------------------------------------------------------
+# BACKFILL FENÊTRÉ + CHECKPOINT (reprise après interruption)
+# ---------------------------------------------------------
+def is_backfill_done(account_id: str) -> bool:
+    return bool(db.get_sync_state(account_id).get("backfill_done"))
 
-        try:
-            cur.execute("""
-                INSERT OR REPLACE INTO deals (
-                    id, platform, type, time, broker_time, commission, swap, 
-                    profit, symbol, magic, order_id, position_id, reason, 
-                    broker_comment, entry_type, volume, price, stop_loss, 
-                    take_profit, account_currency_exchangeRate 
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 
-                            ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                deal.get("id"),
-                deal.get("platform"),
-                deal.get("type"),
-                deal.get("time"),
-                deal.get("brokerTime"),
-                deal.get("commission"),
-                deal.get("swap"),
-                deal.get("profit"),
-                deal.get("symbol"),
-                deal.get("magic"),
-                deal.get("orderId"),
-                deal.get("positionId"),
-                deal.get("reason"),
-                deal.get("brokerComment"),
-                deal.get("entryType"),
-                deal.get("volume"),
-                deal.get("price"),
-                deal.get("stopLoss"),
-                deal.get("takeProfit"),
-                deal.get("accountCurrencyExchangeRate"),
-                #"default",  # ou ton vrai account_id
-            ))
-            inserted += 1
 
-        except Exception as e:
-            logger.error(f"Échec insertion DB: {e}")
+def _next_window_ms(window_ms: float, nb_deals: int) -> float:
+    """Adapte la taille de fenêtre à la densité observée (vise TARGET deals)."""
+    if nb_deals == 0:
+        window_ms *= 2
+    elif nb_deals > 2 * BACKFILL_TARGET_DEALS:
+        window_ms /= 2
+    elif nb_deals < BACKFILL_TARGET_DEALS / 2:
+        window_ms *= 1.5
+    return min(max(window_ms, BACKFILL_MIN_WINDOW_MS), BACKFILL_MAX_WINDOW_MS)
 
-    conn.commit()
-    conn.close()
-    return inserted
+
+async def _backfill_async(meta_client: MetaApiClient) -> Dict[str, int]:
+    """
+    Backfill exécuté sur la boucle du MetaApiClient :
+    - jusqu'à BACKFILL_CONCURRENCY fenêtres préchargées en parallèle
+      (première page RPC brute uniquement, non décodée)
+    - un seul écrivain, qui applique les fenêtres DANS L'ORDRE → le
+      checkpoint ne fait qu'avancer (reprise sûre après interruption)
+    - chaque page est décodée au fil de l'eau directement dans ingest_deals :
+      au plus BACKFILL_CONCURRENCY réponses brutes en mémoire, jamais de
+      liste de deals par fenêtre
+    """
+    account_id = meta_client.account_id
+    db.claim_orphan_deals(account_id)
+    state = db.get_sync_state(account_id)
+    loop = asyncio.get_running_loop()
+    limiter = RpcRateLimiter(RPC_MAX_PER_SECOND)
+
+    cursor_ms = state.get("backfill_cursor_ms") or db.to_epoch_ms(BACKFILL_START)
+    plan_ms = cursor_ms
+    end_ms = int(time.time() * 1000)
+    window_ms = BACKFILL_INITIAL_WINDOW_DAYS * 86400 * 1000
+    totals = {"windows": 0, "deals": 0, "inserted": 0, "updated": 0}
+    pending: deque = deque()  # (start_ms, end_ms, task) dans l'ordre chronologique
+
+    if state.get("backfill_cursor_ms"):
+        logger.info(f"↩ Reprise du backfill depuis {_utc_from_ms(cursor_ms)}")
+
+    try:
+        while plan_ms < end_ms or pending:
+            # planification : remplit jusqu'au plafond de concurrence
+            while plan_ms < end_ms and len(pending) < max(1, BACKFILL_CONCURRENCY):
+                window_end_ms = int(min(plan_ms + window_ms, end_ms))
+                task = asyncio.ensure_future(_get_deals_page(
+                    _utc_from_ms(plan_ms), _utc_from_ms(window_end_ms), meta_client, 0, limiter
+                ))
+                pending.append((plan_ms, window_end_ms, task))
+                plan_ms = window_end_ms
+
+            # écrivain unique : fenêtre la plus ancienne d'abord
+            window_start_ms, window_end_ms, task = pending.popleft()
+            window = (window_start_ms, window_end_ms)
+            nb_deals = 0
+            # SQLite est synchrone → hors de la boucle pour ne pas bloquer les RPC
+            async for page in stream_rpc_window(
+                _utc_from_ms(window_start_ms), _utc_from_ms(window_end_ms), meta_client,
+                limiter, first_page=await task,
+            ):
+                stats = await loop.run_in_executor(None, save_deals_to_db, page, account_id, window)
+                nb_deals += page.count
+                totals["inserted"] += stats["inserted"]
+                totals["updated"] += stats["updated"]
+            await loop.run_in_executor(
+                None, lambda: db.update_sync_state(account_id, backfill_cursor_ms=window_end_ms)
+            )
+
+            totals["windows"] += 1
+            totals["deals"] += nb_deals
+            if nb_deals:
+                logger.info(
+                    f"  fenêtre {_utc_from_ms(window_start_ms):%Y-%m-%d %H:%M} → "
+                    f"{_utc_from_ms(window_end_ms):%Y-%m-%d %H:%M} : {nb_deals} deals"
+                )
+
+            # la densité observée règle la taille des prochaines fenêtres planifiées
+            window_ms = _next_window_ms(window_ms, nb_deals)
+    except BaseException:
+        for _, _, task in pending:
+            task.cancel()
+        raise
+
+    await loop.run_in_executor(
+        None,
+        lambda: db.update_sync_state(
+            account_id, backfill_cursor_ms=end_ms, backfill_done=1, watermark_ms=end_ms
+        ),
+    )
+    return totals
 
 
 # ---------------------------------------------------------
-# FULL SYNC — OPTION 1 : simple, direct
+# FULL SYNC — backfill fenêtré, reprend au dernier checkpoint
 # ---------------------------------------------------------
-def full_sync_history(meta_client: MetaApiClient):
-    logger.info("🚀 FULL SYNC — SIMPLE (Option 1)")
+async def _full_sync_async(meta_client: MetaApiClient) -> int:
+    logger.info("🚀 FULL SYNC — backfill fenêtré")
 
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
+    totals = await _backfill_async(meta_client)
 
-    # récupère tout l’historique en 1 appel
-    START = datetime(2000, 1, 1)
-    END = datetime.utcnow()
+    logger.info(
+        f"✔ Backfill terminé : {totals['deals']} deals reçus en {totals['windows']} fenêtres "
+        f"({totals['inserted']} insérés / {totals['updated']} mis à jour)"
+    )
 
-    deals = loop.run_until_complete(fetch_rpc_deals(START, END, meta_client))
-    loop.close()
+    return totals["inserted"]
 
-    logger.info(f"→ {len(deals)} deals reçus")
 
-    inserted = save_deals_to_db(deals)
-    logger.info(f"✔ {inserted} deals insérés dans la base")
+# ---------------------------------------------------------
+# INCREMENTAL SYNC — simple et propre
+# ---------------------------------------------------------
+async def _incremental_async(meta_client: MetaApiClient) -> int:
+    """
+    Récupère [watermark - SYNC_OVERLAP_SECONDS, maintenant] puis avance le
+    watermark à `maintenant`. Les deals déjà connus de l'overlap sont
+    dédupliqués par id (upsert "si changé" → comptés inchangés).
+    En cas d'échec RPC le watermark ne bouge pas : rien n'est perdu.
+    """
+    logger.info("🔄 INCREMENTAL SYNC")
+    account_id = meta_client.account_id
+    loop = asyncio.get_running_loop()
+
+    # deals hérités sans compte (migration v6 sans ACCOUNT_ID) : rattachés
+    # avant la lecture de l'état, qui en hérite
+    await loop.run_in_executor(None, db.claim_orphan_deals, account_id)
+    state = await loop.run_in_executor(None, db.get_sync_state, account_id)
+    if not state.get("backfill_done"):
+        logger.info("⚠ Backfill incomplet — reprise du FULL SYNC")
+        return await _full_sync_async(meta_client)
+
+    watermark_ms = state.get("watermark_ms") or state["backfill_cursor_ms"]
+    start_ms = watermark_ms - SYNC_OVERLAP_SECONDS * 1000
+    end_ms = int(time.time() * 1000)
+
+    # chaque page est décodée au fil de l'eau directement dans l'écrivain
+    # (SQLite est synchrone → hors de la boucle pour ne pas bloquer les RPC)
+    stats = {"inserted": 0, "updated": 0, "unchanged": 0, "skipped": 0}
+    async for page in stream_rpc_window(_utc_from_ms(start_ms), _utc_from_ms(end_ms), meta_client):
+        page_stats = await loop.run_in_executor(
+            None, save_deals_to_db, page, account_id, (start_ms, end_ms)
+        )
+        for k in stats:
+            stats[k] += page_stats[k]
 
-    return inserted
+    await loop.run_in_executor(
+        None, lambda: db.update_sync_state(account_id, watermark_ms=end_ms)
+    )
+    logger.info(
+        f"✔ INCREMENTAL SYNC — {stats['inserted']} deals ajoutés, "
+        f"{stats['updated']} mis à jour, {stats['unchanged']} déjà connus"
+    )
 
+    return stats["inserted"]
 
 
 # ---------------------------------------------------------
-# INCREMENTAL SYNC — simple et propre
+# RÉCONCILIATION — détection des trous + réparation ciblée
+# ---------------------------------------------------------
+async def _reconcile_async(
+    meta_client: MetaApiClient, horizon_days: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Compare, jour par jour, l'empreinte (nb deals + checksum) de la DB locale
+    et celle de MetaApi sur [minuit(watermark - horizon), watermark].
+    Seuls les jours différents sont réécrits (upsert) : un run incrémental
+    raté ne laisse plus de trou permanent, sans full re-sync périodique.
+    """
+    account_id = meta_client.account_id
+    horizon_days = RECONCILE_HORIZON_DAYS if horizon_days is None else horizon_days
+    loop = asyncio.get_running_loop()
+    report: Dict[str, Any] = {"account_id": account_id, "checked_days": 0, "mismatched_days": []}
+
+    state = await loop.run_in_executor(None, db.get_sync_state, account_id)
+    if not state.get("backfill_done"):
+        report["skipped"] = "backfill incomplet"
+        return report
+
+    # on ne compare que ce que la sync a déjà couvert (jusqu'au watermark)
+    end_ms = state.get("watermark_ms") or state["backfill_cursor_ms"]
+    start_ms = (end_ms // 86400000 - horizon_days) * 86400000
+
+    deals = await fetch_rpc_window(
+        _utc_from_ms(start_ms), _utc_from_ms(end_ms), meta_client, RpcRateLimiter(RPC_MAX_PER_SECOND)
+    )
+    remote: Dict[str, db.DealRecord] = {}
+    raw_by_id: Dict[str, Dict[str, Any]] = {}
+    for deal in deals:
+        if isinstance(deal, dict) and deal.get("id"):
+            record = db.DealRecord.from_metaapi(deal, account_id)
+            if record.time_ms is not None and start_ms <= record.time_ms <= end_ms:
+                remote[record.id] = record
+                raw_by_id[record.id] = deal
+
+    remote_digests = db.digest_records(remote.values())
+    local_digests = await loop.run_in_executor(
+        None, db.local_day_digests, account_id, start_ms, end_ms
+    )
+
+    days = sorted(set(remote_digests) | set(local_digests))
+    mismatched = [d for d in days if remote_digests.get(d) != local_digests.get(d)]
+    report["checked_days"] = len(days)
+    report["mismatched_days"] = mismatched
+
+    if not mismatched:
+        logger.info(f"🧮 [{account_id}] Réconciliation OK — {len(days)} jours identiques")
+        return report
+
+    for day in mismatched:
+        local_n = local_digests.get(day, (0, 0))[0]
+        remote_n = remote_digests.get(day, (0, 0))[0]
+        logger.warning(f"🧮 [{account_id}] Écart le {day} : {local_n} deals en base / {remote_n} chez MetaApi")
+
+    # réparation ciblée : seuls les deals des jours en écart sont réécrits
+    wanted = set(mismatched)
+    repair = [raw_by_id[r.id] for r in remote.values() if r.day in wanted]
+    stats = await loop.run_in_executor(
+        None, save_deals_to_db, repair, account_id, (start_ms, end_ms)
+    )
+    report["repaired"] = stats
+
+    # deals présents en base mais absents chez MetaApi : signalés, jamais supprimés
+    after = await loop.run_in_executor(None, db.local_day_digests, account_id, start_ms, end_ms)
+    report["still_mismatched_days"] = [d for d in mismatched if after.get(d) != remote_digests.get(d)]
+    if report["still_mismatched_days"]:
+        logger.warning(
+            f"⚠ [{account_id}] Écart persistant (deals locaux inconnus de MetaApi ?) : "
+            f"{', '.join(report['still_mismatched_days'])}"
+        )
+
+    logger.info(
+        f"✔ [{account_id}] Réconciliation — {len(mismatched)} jours réparés "
+        f"({stats['inserted']} deals ajoutés, {stats['updated']} corrigés)"
+    )
+    return report
+
+
+# ---------------------------------------------------------
+# ORDONNANCEUR — tout tourne sur la boucle du MetaApiClient
 # ---------------------------------------------------------
+class HistorySyncScheduler:
+    """
+    Exécute les syncs sur la boucle du MetaApiClient (celle qui possède la
+    connexion RPC) : pas de boucle créée par run, pas de connexion utilisée
+    depuis une boucle étrangère. Les syncs sont sérialisées (full et
+    incrémentale écrivent le même sync_state).
+
+    - API async (`await scheduler.incremental_sync()`) pour FastAPI : la
+      boucle appelante attend un Future, aucun thread n'est bloqué
+    - API bloquante (`scheduler.run_incremental_sync()`) pour le code sync
+    """
+
+    def __init__(self, meta_client: MetaApiClient):
+        self.meta_client = meta_client
+        self._lock: Optional[asyncio.Lock] = None  # créé sur la boucle du client
+
+    async def _serialized(self, job):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            return await job(self.meta_client)
+
+    def _submit(self, job):
+        return self.meta_client.submit(self._serialized(job))
+
+    async def full_sync(self) -> int:
+        return await asyncio.wrap_future(self._submit(_full_sync_async))
+
+    async def incremental_sync(self) -> int:
+        return await asyncio.wrap_future(self._submit(_incremental_async))
+
+    async def reconcile(self, horizon_days: Optional[int] = None) -> Dict[str, Any]:
+        return await asyncio.wrap_future(
+            self._submit(lambda client: _reconcile_async(client, horizon_days))
+        )
+
+    def run_full_sync(self, timeout: Optional[float] = None) -> int:
+        return self._submit(_full_sync_async).result(timeout=timeout)
+
+    def run_incremental_sync(self, timeout: Optional[float] = None) -> int:
+        return self._submit(_incremental_async).result(timeout=timeout)
+
+    def run_reconcile(self, horizon_days: Optional[int] = None, timeout: Optional[float] = None) -> Dict[str, Any]:
+        return self._submit(lambda client: _reconcile_async(client, horizon_days)).result(timeout=timeout)
+
+
+_SCHEDULERS: Dict[int, HistorySyncScheduler] = {}
+
+
+def get_scheduler(meta_client: MetaApiClient) -> HistorySyncScheduler:
+    """Un ordonnanceur (donc un verrou de sérialisation) par client MetaApi."""
+    scheduler = _SCHEDULERS.get(id(meta_client))
+    if scheduler is None or scheduler.meta_client is not meta_client:
+        scheduler = _SCHEDULERS[id(meta_client)] = HistorySyncScheduler(meta_client)
+    return scheduler
+
+
+def full_sync_history(meta_client: MetaApiClient):
+    """Version bloquante (threads / scripts) : attend le backfill sur la boucle du client."""
+    return get_scheduler(meta_client).run_full_sync()
+
+
 def incremental_sync_history(meta_client: MetaApiClient):
-    logger.info("🔄 INCREMENTAL SYNC")
+    """Version bloquante (threads / scripts) : attend la sync sur la boucle du client."""
+    return get_scheduler(meta_client).run_incremental_sync()
 
-    conn = db.get_db_connection()
-    cur = conn.cursor()
 
-    cur.execute("SELECT MAX(time) AS last FROM deals")
-    row = cur.fetchone()
-    conn.close()
+# ---------------------------------------------------------
+# DÉCLENCHEMENT — événements streaming / ordres + polling adaptatif
+# ---------------------------------------------------------
+class SyncWakeup:
+    """
+    Réveil de la tâche de sync incrémentale, appelable depuis n'importe quel
+    thread (boucle MetaApi, dispatcher Telegram...). Les demandes reçues
+    avant attach() ou entre deux attentes sont regroupées.
+    """
+
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._event: Optional[asyncio.Event] = None
+        self._reasons: List[str] = []
+        self._lock = threading.Lock()  # _reasons : écrit depuis n'importe quel thread
+
+    def attach(self):
+        """À appeler depuis la coroutine qui attendra (lie l'Event à sa boucle)."""
+        event = asyncio.Event()
+        with self._lock:
+            self._loop = asyncio.get_running_loop()
+            self._event = event
+            if self._reasons:
+                event.set()
+
+    def request(self, reason: str) -> None:
+        # raison enregistrée d'abord : une demande faite avant attach() n'est pas perdue
+        with self._lock:
+            self._reasons.append(reason)
+            loop, event = self._loop, self._event
+        if loop is None or loop.is_closed():
+            return
+        loop.call_soon_threadsafe(event.set)
+
+    async def wait(self, timeout: float) -> List[str]:
+        """Attend une demande ou `timeout` secondes ; retourne les raisons reçues."""
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._event.clear()
+        with self._lock:
+            reasons, self._reasons = self._reasons, []
+        return reasons
 
-    if not row or not row["last"]:
-        logger.info("⚠ Aucun historique — démarrage FULL SYNC")
-        return full_sync_history(meta_client)
 
-    start = datetime.fromisoformat(row["last"])
-    end = datetime.utcnow()
+# un réveil par compte (une tâche de sync par compte)
+_WAKEUPS: Dict[str, SyncWakeup] = {}
 
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    deals = loop.run_until_complete(fetch_rpc_deals(start, end, meta_client))
-    loop.close()
 
-    inserted = save_deals_to_db(deals)
-    logger.info(f"✔ INCREMENTAL SYNC — {inserted} deals ajoutés")
+def get_wakeup(account_id: str) -> SyncWakeup:
+    wakeup = _WAKEUPS.get(account_id)
+    if wakeup is None:
+        wakeup = _WAKEUPS.setdefault(account_id, SyncWakeup())
+    return wakeup
 
-    return inserted
+
+def request_sync(reason: str, account_id: Optional[str] = None) -> None:
+    """
+    Demande une sync incrémentale au plus tôt (thread-safe, ne bloque pas)
+    pour `account_id`, ou pour tous les comptes si None (ou compte inconnu).
+    """
+    if account_id and account_id not in _WAKEUPS:
+        logger.warning(f"⚠ request_sync({reason}) : compte inconnu {account_id} → tous les comptes")
+        account_id = None
+    if account_id:
+        get_wakeup(account_id).request(reason)
+    else:
+        for wakeup in list(_WAKEUPS.values()):
+            wakeup.request(reason)
+
+
+class AdaptivePollInterval:
+    """Intervalle de polling : minimum en période d'activité, doublé à chaque sync vide."""
+
+    def __init__(self, min_s: float = INCREMENTAL_SYNC_MIN_INTERVAL,
+                 max_s: float = INCREMENTAL_SYNC_MAX_INTERVAL):
+        self.min_s = min_s
+        self.max_s = max(min_s, max_s)
+        self.current = min_s
+
+    def on_activity(self) -> float:
+        self.current = self.min_s
+        return self.current
+
+    def on_idle(self) -> float:
+        self.current = min(self.current * 2, self.max_s)
+        return self.current
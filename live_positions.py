@@ -0,0 +1,175 @@
+# live_positions.py – hub des positions ouvertes (un producteur → N abonnés SSE)
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger("live_positions")
+
+# Clé d'une position : "compte:id" (les ids MetaApi ne sont uniques que par compte)
+PositionKey = str
+
+
+def position_key(item: Dict[str, Any]) -> PositionKey:
+    return f"{item.get('account') or ''}:{item.get('id')}"
+
+
+class _Subscriber:
+    """File de messages d'un client SSE + son filtre (symbole / compte)."""
+
+    __slots__ = ("queue", "symbol", "account")
+
+    def __init__(self, symbol: Optional[str], account: Optional[str], maxsize: int):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.symbol = symbol.upper() if symbol else None
+        self.account = account
+
+    def accepts(self, item: Dict[str, Any]) -> bool:
+        if self.symbol and (item.get("symbol") or "").upper() != self.symbol:
+            return False
+        if self.account and item.get("account") != self.account:
+            return False
+        return True
+
+
+class PositionsHub:
+    """
+    Un seul producteur publie l'état des positions à tous les abonnés :
+    - événements streaming (position mise à jour / fermée), thread-safe
+    - rafraîchissement RPC périodique (filet de sécurité), uniquement s'il
+      y a des abonnés : N onglets ouverts = 1 appel amont
+    Les changements sont regroupés et poussés toutes les `push_interval` s
+    sous forme de diff ; chaque nouvel abonné reçoit d'abord un snapshot.
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[], Awaitable[Dict[str, Any]]],
+        refresh_interval: float = 10.0,
+        push_interval: float = 0.5,
+        queue_size: int = 100,
+    ):
+        self._fetch = fetch
+        self.refresh_interval = refresh_interval
+        self.push_interval = push_interval
+        self.queue_size = queue_size
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._state: Dict[PositionKey, Dict[str, Any]] = {}
+        self._pending_upserts: Dict[PositionKey, Dict[str, Any]] = {}
+        self._pending_removed: set = set()
+        self._subscribers: List[_Subscriber] = []
+        self._refresh_now: Optional[asyncio.Event] = None
+        self.status = "starting"
+
+    # ---------- événements (depuis n'importe quel thread) ----------
+    def publish_update(self, item: Dict[str, Any]) -> None:
+        self._call_soon(self._apply_update, item)
+
+    def publish_removed(self, account_id: str, position_id: str) -> None:
+        self._call_soon(self._apply_removed, f"{account_id or ''}:{position_id}")
+
+    def _call_soon(self, callback, *args) -> None:
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(callback, *args)
+
+    def _apply_update(self, item: Dict[str, Any]) -> None:
+        key = position_key(item)
+        if self._state.get(key) != item:
+            self._state[key] = item
+            self._pending_upserts[key] = item
+            self._pending_removed.discard(key)
+
+    def _apply_removed(self, key: PositionKey) -> None:
+        if self._state.pop(key, None) is not None:
+            self._pending_upserts.pop(key, None)
+            self._pending_removed.add(key)
+
+    def _apply_snapshot(self, items: List[Dict[str, Any]], accounts: Optional[List[str]] = None) -> None:
+        """État complet ; `accounts` : comptes effectivement interrogés (les autres sont conservés)."""
+        fresh = {position_key(item): item for item in items}
+        scope = None if accounts is None else {f"{a or ''}:" for a in accounts}
+        for key in [k for k in self._state if k not in fresh]:
+            if scope is None or key[: key.index(":") + 1] in scope:
+                self._apply_removed(key)
+        for item in fresh.values():
+            self._apply_update(item)
+
+    # ---------- abonnés ----------
+    def snapshot(self, sub: Optional[_Subscriber] = None) -> Dict[str, Any]:
+        items = [i for i in self._state.values() if sub is None or sub.accepts(i)]
+        items.sort(key=lambda x: x.get("time") or "", reverse=True)
+        return {"type": "snapshot", "status": self.status, "items": items}
+
+    def subscribe(self, symbol: Optional[str] = None, account: Optional[str] = None) -> _Subscriber:
+        sub = _Subscriber(symbol, account, self.queue_size)
+        sub.queue.put_nowait(self.snapshot(sub))
+        self._subscribers.append(sub)
+        if self.status == "starting" and self._refresh_now is not None:
+            self._refresh_now.set()  # premier abonné : état initial sans attendre
+        return sub
+
+    def unsubscribe(self, sub: _Subscriber) -> None:
+        if sub in self._subscribers:
+            self._subscribers.remove(sub)
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def _flush(self) -> None:
+        if not (self._pending_upserts or self._pending_removed):
+            return
+        upserts = list(self._pending_upserts.values())
+        removed = list(self._pending_removed)
+        self._pending_upserts = {}
+        self._pending_removed = set()
+
+        for sub in self._subscribers:
+            message = {
+                "type": "diff",
+                "status": self.status,
+                "upserts": [i for i in upserts if sub.accepts(i)],
+                "removed": removed,
+            }
+            if not message["upserts"] and not message["removed"]:
+                continue
+            try:
+                sub.queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # client trop lent : on jette ses diffs en attente et on resynchronise
+                while not sub.queue.empty():
+                    sub.queue.get_nowait()
+                sub.queue.put_nowait(self.snapshot(sub))
+
+    # ---------- producteur ----------
+    async def run(self) -> None:
+        """Tâche unique : rafraîchit (si abonnés) et pousse les diffs regroupés."""
+        self._loop = asyncio.get_running_loop()
+        self._refresh_now = asyncio.Event()
+        next_refresh = 0.0
+
+        while True:
+            now = self._loop.time()
+            refresh_requested = self._refresh_now.is_set()
+            # toujours consommé : sinon, sans abonné, wait() rendrait la main aussitôt (boucle active)
+            self._refresh_now.clear()
+            if self._subscribers and (now >= next_refresh or refresh_requested):
+                try:
+                    # fetch() → {"status": ..., "items": [...]} (format de /api/open-trades)
+                    payload = await self._fetch()
+                    self.status = payload.get("status", "ok")
+                    # snapshot appliqué seulement s'il est fiable (pas "non connecté")
+                    if self.status == "ok":
+                        self._apply_snapshot(payload.get("items") or [], payload.get("accounts"))
+                except Exception as e:
+                    # erreur amont : on garde le dernier état connu
+                    self.status = "error"
+                    logger.error(f"Erreur rafraîchissement positions live: {e}")
+                next_refresh = self._loop.time() + self.refresh_interval
+
+            self._flush()
+            try:
+                await asyncio.wait_for(self._refresh_now.wait(), self.push_interval)
+            except asyncio.TimeoutError:
+                pass
@@ -1,19 +1,67 @@
-# metaapi_client.py (RPC léger – sans streaming)
+# metaapi_client.py (RPC léger + streaming optionnel pour les événements)
+import time
 import asyncio
 import threading
 import logging
+import concurrent.futures
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
 from metaapi_cloud_sdk import MetaApi
+from metaapi_cloud_sdk.clients.metaapi.synchronization_listener import SynchronizationListener
 
 logger = logging.getLogger(__name__)
 
+# délai max d'un appel get_positions() côté MetaApi
+POSITIONS_TIMEOUT_SECONDS = 10
+# connexion initiale en échec : nouvel essai avec backoff exponentiel plafonné
+CONNECT_RETRY_MIN_SECONDS = 5
+CONNECT_RETRY_MAX_SECONDS = 300
+
+
+class _EventListener(SynchronizationListener):
+    """Relaie les événements streaming MetaApi vers MetaApiClient._emit."""
+
+    def __init__(self, client: "MetaApiClient"):
+        super().__init__()
+        self.client = client
+
+    async def on_deal_added(self, instance_index: str, deal):
+        self.client._emit("deal_added", deal)
+
+    async def on_position_updated(self, instance_index: str, position):
+        self.client._emit("position_updated", position)
+
+    async def on_position_removed(self, instance_index: str, position_id: str):
+        self.client._emit("position_removed", position_id)
+
+
 class MetaApiClient:
-    def __init__(self, api_key: str, account_id: str):
+    def __init__(
+        self,
+        api_key: str,
+        account_id: str,
+        streaming: bool = False,
+        positions_ttl: float = 1.0,
+    ):
         self.api_key = api_key
         self.account_id = account_id
         self.api = None
         self.account = None
         self.connection = None
 
+        # connexion streaming (événements deals/positions), optionnelle
+        self.streaming = streaming
+        self.streaming_connection = None
+        self._streaming_ready = False
+        self._event_handlers: List[Callable[[str, Any], None]] = []
+
+        # positions ouvertes : un seul appel RPC en vol + cache court (TTL)
+        self.positions_ttl = positions_ttl
+        self._positions_lock = threading.Lock()
+        self._positions_inflight: Optional[concurrent.futures.Future] = None
+        self._positions_cache: Optional[Tuple[float, List[Dict[str, Any]]]] = None
+
         self._connected = False
         self.loop = None
 
@@ -37,26 +85,143 @@ class MetaApiClient:
         self._connected = True
         logger.info("MetaApi RPC READY ✔️")
 
+        if self.streaming:
+            await self._connect_streaming()
+
+    async def connect_with_retry(self):
+        """connect_async relancé (backoff exponentiel) jusqu'au succès : compte indisponible au démarrage..."""
+        delay = CONNECT_RETRY_MIN_SECONDS
+        while True:
+            try:
+                await self.connect_async()
+                return
+            except Exception as e:
+                logger.error(
+                    f"❌ [{self.account_id}] Connexion MetaApi échouée: {e} — nouvel essai dans {delay:.0f}s"
+                )
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, CONNECT_RETRY_MAX_SECONDS)
+
+    async def _connect_streaming(self):
+        """
+        Ouvre la connexion streaming. Un échec n'est pas bloquant :
+        l'application retombe sur le polling.
+        """
+        try:
+            # history_start_time=maintenant : pas de re-téléchargement de
+            # l'historique par le streaming (la DB s'en charge)
+            self.streaming_connection = self.account.get_streaming_connection(
+                history_start_time=datetime.utcnow()
+            )
+            self.streaming_connection.add_synchronization_listener(_EventListener(self))
+            await self.streaming_connection.connect()
+            await self.streaming_connection.wait_synchronized()
+            self._streaming_ready = True
+            logger.info("MetaApi STREAMING READY ✔️ (événements deals/positions)")
+        except Exception as e:
+            logger.error(f"❌ Streaming MetaApi indisponible, polling seul: {e}")
+
+    def add_event_handler(self, handler: Callable[[str, Any], None]) -> None:
+        """
+        Enregistre `handler(kind, payload)` appelé sur la boucle du client pour
+        kind ∈ {"deal_added", "position_updated", "position_removed"}.
+        Le handler doit être rapide et ne pas bloquer.
+        """
+        self._event_handlers.append(handler)
+
+    def _emit(self, kind: str, payload: Any) -> None:
+        # on ignore le flux initial de synchronisation
+        if not self._streaming_ready:
+            return
+        for handler in self._event_handlers:
+            try:
+                handler(kind, payload)
+            except Exception as e:
+                logger.error(f"Erreur handler événement {kind}: {e}")
+
     def connect_threaded(self):
         def run():
             self.loop = asyncio.new_event_loop()
             asyncio.set_event_loop(self.loop)
-            self.loop.run_until_complete(self.connect_async())
+            self.loop.run_until_complete(self.connect_with_retry())
             self.loop.run_forever()
 
         t = threading.Thread(target=run, daemon=True)
         t.start()
 
-    def get_open_positions(self):
+    def submit(self, coro):
+        """
+        Planifie une coroutine sur la boucle du client (celle qui possède
+        self.connection) depuis n'importe quel thread.
+        Retourne un concurrent.futures.Future.
+        """
+        if not self.loop:
+            coro.close()
+            raise RuntimeError("MetaApiClient non démarré (connect_threaded)")
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro, timeout=None):
+        """Exécute une coroutine sur la boucle du client et attend son résultat."""
+        return self.submit(coro).result(timeout=timeout)
+
+    # ---------- positions ouvertes (single-flight + TTL) ----------
+    async def _fetch_positions(self):
+        return await asyncio.wait_for(self.connection.get_positions(), POSITIONS_TIMEOUT_SECONDS)
+
+    def _positions_future(self) -> concurrent.futures.Future:
+        """
+        Future (concurrent, utilisable depuis n'importe quelle boucle ou thread)
+        des positions ouvertes : résultat en cache s'il a moins de
+        positions_ttl s, sinon l'appel RPC déjà en vol, sinon un nouvel appel.
+        """
+        with self._positions_lock:
+            cached = self._positions_cache
+            if cached is not None and time.monotonic() - cached[0] < self.positions_ttl:
+                future: concurrent.futures.Future = concurrent.futures.Future()
+                future.set_result(cached[1])
+                return future
+
+            future = self._positions_inflight
+            if future is not None:
+                return future
+            future = self._positions_inflight = self.submit(self._fetch_positions())
+
+        # hors verrou : si l'appel est déjà terminé, le callback s'exécute
+        # immédiatement dans ce thread et reprend _positions_lock
+        future.add_done_callback(self._on_positions_done)
+        return future
+
+    def _on_positions_done(self, future: concurrent.futures.Future) -> None:
+        with self._positions_lock:
+            if self._positions_inflight is future:
+                self._positions_inflight = None
+            if not future.cancelled() and future.exception() is None:
+                self._positions_cache = (time.monotonic(), future.result())
+
+    async def get_open_positions_async(self) -> List[Dict[str, Any]]:
+        """
+        Positions ouvertes, sans bloquer la boucle appelante (FastAPI) :
+        les appels concurrents partagent la même requête RPC.
+        Une erreur RPC est propagée (jamais confondue avec "aucune position").
+        """
         if not self._connected or not self.loop:
             return []
 
         try:
-            future = asyncio.run_coroutine_threadsafe(
-                self.connection.get_positions(),
-                self.loop
-            )
-            return future.result(timeout=10)
+            # shield : l'abandon d'un appelant (client HTTP parti) n'annule
+            # pas la requête partagée avec les autres
+            return list(await asyncio.shield(asyncio.wrap_future(self._positions_future())))
         except Exception as e:
             logger.error(f"Erreur get_open_positions: {e}")
+            raise
+
+    def get_open_positions(self):
+        """Variante bloquante (threads hors boucle FastAPI) ; erreurs RPC propagées."""
+        if not self._connected or not self.loop:
             return []
+
+        try:
+            return list(self._positions_future().result(timeout=POSITIONS_TIMEOUT_SECONDS))
+        except Exception as e:
+            logger.error(f"Erreur get_open_positions: {e}")
+            raise
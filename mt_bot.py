@@ -7,7 +7,6 @@ import re
 import json
 import requests
 import pandas as pd
-import sqlite3
 
 try:
     from typing import Literal
@@ -22,7 +21,10 @@ from prettytable import PrettyTable
 from telegram import ParseMode, Update
 from telegram.ext import CommandHandler, Filters, MessageHandler, Updater, ConversationHandler, CallbackContext
 from dotenv import load_dotenv
-from pathlib import Path
+
+import dashboard_db as db
+import analytics_engine
+from history_sync import iter_rpc_deals, request_sync
 
 load_dotenv()  # Charge les variables depuis .env
 
@@ -43,9 +45,8 @@ PORT = os.environ.get("PORT")
 # RISK FACTOR
 RISK_FACTOR = float(os.environ.get("RISK_FACTOR"))
 
-# Base SQLite pour l'historique des trades
-BASE_DIR = Path(__file__).resolve().parent
-DB_PATH = BASE_DIR / "trades.db"
+# Base SQLite pour l'historique des trades (partagée avec le dashboard)
+DB_PATH = db.DB_PATH
 
 
 # Enables logging
@@ -67,36 +68,9 @@ exchange_rate = None
 
 # Helper Functions
 def init_db():
-    """Crée la base SQLite et la table deals si elles n'existent pas."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
-    cursor.execute(
-        """
-        CREATE TABLE IF NOT EXISTS deals (
-            id TEXT PRIMARY KEY,
-            platform TEXT,
-            type TEXT,
-            symbol TEXT,
-            time TEXT,
-            broker_time TEXT,
-            volume REAL,
-            price REAL,
-            profit REAL,
-            entry_type TEXT,
-            reason TEXT,
-            order_id TEXT,
-            position_id TEXT,
-            stop_loss REAL,
-            take_profit REAL,
-            account_id TEXT
-        )
-        """
-    )
-
-    conn.commit()
-    conn.close()
-    logger.info(f"SQLite initialisée sur {DB_PATH}")
+    """Crée/migre la base SQLite (schéma unique défini dans dashboard_db)."""
+    db.init_db()
+    logger.info(f"SQLite initialisée sur {DB_PATH} (schéma v{db.SCHEMA_VERSION})")
 
 def ParseSignal(signal: str) -> dict:
     """Starts process of parsing signal and entering trade on MetaTrader account.
@@ -780,90 +754,31 @@ def save_deals_to_db(raw_history, account_id: str) -> int:
     Enregistre les deals MetaApi dans la base SQLite.
     Retourne le nombre de deals insérés/mis à jour.
     """
-    # 👉 Extraire la vraie liste de deals
-    if isinstance(raw_history, dict) and "deals" in raw_history:
-        deals = raw_history["deals"]
-    else:
-        deals = raw_history  # au cas où MetaApi change de format plus tard
-
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    inserted = 0
-
-    for deal in deals:
-        if not isinstance(deal, dict):
-            logger.warning(f"Deal non dict: {deal}")
-            continue
-
-        deal_id = deal.get("id")
-        if not deal_id:
-            logger.warning(f"Deal sans id: {deal}")
-            continue
-
-        platform = deal.get("platform")
-        deal_type = deal.get("type")
-        symbol = deal.get("symbol")
-        time = deal.get("time")
-        broker_time = deal.get("brokerTime")
-        volume = deal.get("volume")
-        price = deal.get("price")
-        profit = deal.get("profit")
-        entry_type = deal.get("entryType")
-        reason = deal.get("reason")
-        order_id = deal.get("orderId")
-        position_id = deal.get("positionId")
-        stop_loss = deal.get("stopLoss")
-        take_profit = deal.get("takeProfit")
-
-        try:
-            cursor.execute(
-                """
-                INSERT OR REPLACE INTO deals (
-                    id, platform, type, symbol, time, broker_time,
-                    volume, price, profit, entry_type, reason,
-                    order_id, position_id, stop_loss, take_profit,
-                    account_id
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """,
-                (
-                    deal_id,
-                    platform,
-                    deal_type,
-                    symbol,
-                    time,
-                    broker_time,
-                    volume,
-                    price,
-                    profit,
-                    entry_type,
-                    reason,
-                    order_id,
-                    position_id,
-                    stop_loss,
-                    take_profit,
-                    account_id,
-                ),
-            )
-            inserted += 1
-        except Exception as e:
-            logger.error(f"Échec insertion DB pour deal {deal_id}: {e}")
-
-    conn.commit()
-    conn.close()
-    logger.info(f"{inserted} deals insérés/mis à jour dans SQLite")
+    # 👉 Extraire la vraie liste de deals (dict, liste ou JSON texte) et
+    # ingestion en masse partagée avec history_sync (DealRecord, une transaction)
+    stats = db.ingest_deals(iter_rpc_deals(raw_history), account_id=account_id)
+    if stats["skipped"]:
+        logger.warning(f"{stats['skipped']} deals ignorés (non dict ou sans id)")
+
+    inserted = stats["inserted"] + stats["updated"]
+    logger.info(
+        f"{inserted} deals insérés/mis à jour dans SQLite "
+        f"({stats['unchanged']} inchangés)"
+    )
     return inserted
 
 def get_trade_report_from_db(days: int = 210, symbol: str = None):
     """Calcule un petit rapport de trading à partir de la table deals."""
-    conn = sqlite3.connect(DB_PATH)
+    conn = db.get_db_connection()
     cursor = conn.cursor()
 
-    # Filtre de date : derniers X jours
-    from_date = (datetime.utcnow() - timedelta(days=days)).isoformat()
+    # Filtre de date : derniers X jours (depuis minuit UTC, même fenêtre que les analytics)
+    from_ms = db.window_start_ms(days)
 
-    params = [from_date]
+    params = [from_ms]
     symbol_filter = ""
     if symbol:
+        symbol = symbol.upper()
         symbol_filter = "AND symbol = ?"
         params.append(symbol)
 
@@ -874,7 +789,7 @@ def get_trade_report_from_db(days: int = 210, symbol: str = None):
           COUNT(*) as nb_deals,
           SUM(profit) as pnl_total
         FROM deals
-        WHERE time >= ?
+        WHERE time_ms >= ?
         {symbol_filter}
           AND volume IS NOT NULL
           AND profit IS NOT NULL
@@ -890,7 +805,7 @@ def get_trade_report_from_db(days: int = 210, symbol: str = None):
           SUM(CASE WHEN profit > 0 THEN 1 ELSE 0 END) as wins,
           SUM(CASE WHEN profit <= 0 THEN 1 ELSE 0 END) as losses
         FROM deals
-        WHERE time >= ?
+        WHERE time_ms >= ?
         {symbol_filter}
           AND volume IS NOT NULL
           AND entry_type = 'DEAL_ENTRY_OUT'
@@ -906,10 +821,10 @@ def get_trade_report_from_db(days: int = 210, symbol: str = None):
     cursor.execute(
         f"""
         SELECT 
-          substr(time, 1, 10) as day,
+          day,
           SUM(profit) as pnl
         FROM deals
-        WHERE time >= ?
+        WHERE time_ms >= ?
         {symbol_filter}
           AND profit IS NOT NULL
         GROUP BY day
@@ -927,19 +842,17 @@ def get_trade_report_from_db(days: int = 210, symbol: str = None):
           COUNT(*) as n,
           SUM(profit) as pnl
         FROM deals
-        WHERE time >= ?
+        WHERE time_ms >= ?
         {symbol_filter.replace("AND symbol = ?", "")}  -- on enlève le filtre si déjà symbol fixé
           AND volume IS NOT NULL
         GROUP BY symbol
         ORDER BY pnl DESC
         LIMIT 10
         """,
-        [from_date],
+        [from_ms],
     )
     by_symbol = cursor.fetchall()
 
-    conn.close()
-
     return {
         "nb_deals": nb_deals or 0,
         "pnl_total": pnl_total or 0,
@@ -1077,6 +990,8 @@ async def ConnectCloseTrade(update: Update, context: CallbackContext, trade: dic
                         await connection.modify_position(position_id, stop_loss=opening_price, take_profit=takeprofit)
                         update.effective_message.reply_text(f"Breakeven défini pour la position {position_id}.")
 
+        # deals de clôture → sync incrémentale du dashboard sans attendre le polling
+        request_sync("close_trade", ACCOUNT_ID)
 
         return result
 
@@ -1412,6 +1327,9 @@ async def ConnectPlaceTrade(update: Update, context: CallbackContext, trade: dic
                 # prints success message to console
                 logger.info('\nTrade entered successfully!')
                 logger.info('Result Code: {}\n'.format(result['stringCode']))
+
+                # nouvel ordre → sync incrémentale du dashboard sans attendre le polling
+                request_sync("place_trade", ACCOUNT_ID)
             
             except Exception as error:
                 logger.info(f"\nTrade failed with error: {error}\n")
@@ -2230,6 +2148,23 @@ def GetTradeReport(update: Update, context: CallbackContext):
     for sym, n, pnl in report["by_symbol"]:
         msg += f"  - {sym} : {pnl} ({n} deals)\n"
 
+    # Métriques avancées (moteur analytics, sorties uniquement)
+    try:
+        m = analytics_engine.performance_metrics(days=days, symbol=symbol)
+    except Exception as e:
+        logger.error(f"Erreur métriques avancées /report: {e}")
+    else:
+        def fmt(value):
+            return "n/a" if value is None else value
+
+        msg += "\nMétriques avancées :\n"
+        msg += f"• Profit factor : {fmt(m['profit_factor'])}\n"
+        msg += f"• Espérance / trade : {m['expectancy']}\n"
+        msg += f"• Gain moyen : {m['avg_win']} | Perte moyenne : {m['avg_loss']}\n"
+        msg += f"• Séries max : {m['longest_win_streak']} gains / {m['longest_loss_streak']} pertes\n"
+        msg += f"• Perte consécutive max : {m['max_consecutive_loss']}\n"
+        msg += f"• Sharpe (jour) : {fmt(m['sharpe_daily'])} | Sortino (jour) : {fmt(m['sortino_daily'])}\n"
+
     update.effective_message.reply_text(msg)
 
 def setup_dispatcher(dp):
@@ -0,0 +1,118 @@
+# scripts/bench_ingest_memory.py – mémoire de l'ingestion d'une réponse RPC texte
+#
+# Compare, pour une réponse MetaApi JSON texte de N deals, ingérée dans une DB
+# temporaire neuve (jamais trades.db) :
+#   list   : json.loads + liste complète de dicts + ingest_deals(liste)
+#   stream : iter_rpc_deals (raw_decode élément par élément) → ingest_deals par paquets
+# Pic mémoire mesuré avec tracemalloc (la chaîne d'entrée, déjà en mémoire,
+# n'est pas comptée), puis temps sans tracemalloc.
+#
+# Usage :
+#   python scripts/bench_ingest_memory.py [--deals 100000 1000] [--runs 1]
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import statistics
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import dashboard_db as db  # noqa: E402
+from history_sync import _normalize_rpc_deals, iter_rpc_deals  # noqa: E402
+
+
+def rpc_payload(n: int, seed: int = 42) -> str:
+    """Réponse RPC texte `{"deals": [...]}` de `n` deals MetaApi réalistes."""
+    rng = random.Random(seed)
+    now_ms = int(time.time() * 1000)
+    deals = [
+        {
+            "id": str(100000000 + i),
+            "platform": "mt5",
+            "type": rng.choice(("DEAL_TYPE_BUY", "DEAL_TYPE_SELL")),
+            "time": db.iso_from_ms(now_ms - rng.randrange(3 * 365 * 86400 * 1000)),
+            "brokerTime": "2025-01-01 00:00:00.000",
+            "commission": -0.7,
+            "swap": 0.0,
+            "profit": round(rng.gauss(0.5, 20), 2),
+            "symbol": rng.choice(("EURUSD", "XAUUSD", "GBPUSD", "USDJPY")),
+            "magic": 0,
+            "orderId": str(200000000 + i),
+            "positionId": str(300000000 + i),
+            "reason": "DEAL_REASON_EXPERT",
+            "brokerComment": "copier",
+            "entryType": rng.choice(("DEAL_ENTRY_IN", "DEAL_ENTRY_OUT")),
+            "volume": 0.1,
+            "price": round(rng.uniform(1, 2000), 5),
+            "accountCurrencyExchangeRate": 1,
+        }
+        for i in range(n)
+    ]
+    return json.dumps({"deals": deals})
+
+
+def ingest_list(text: str) -> Dict[str, int]:
+    return db.ingest_deals(_normalize_rpc_deals(json.loads(text)), account_id="BENCH")
+
+
+def ingest_stream(text: str) -> Dict[str, int]:
+    return db.ingest_deals(iter_rpc_deals(text), account_id="BENCH")
+
+
+VARIANTS: Dict[str, Callable[[str], Dict[str, int]]] = {
+    "json.loads + list ingest": ingest_list,
+    "raw_decode stream ingest": ingest_stream,
+}
+
+
+def _fresh_db() -> None:
+    db.close_all_connections()
+    db.DB_PATH = Path(tempfile.mkdtemp()) / "bench.db"
+    db.init_db()
+
+
+def peak_mb(func: Callable[[str], Any], text: str) -> float:
+    _fresh_db()
+    tracemalloc.start()
+    try:
+        func(text)
+        return tracemalloc.get_traced_memory()[1] / 1e6
+    finally:
+        tracemalloc.stop()
+
+
+def mean_s(func: Callable[[str], Any], text: str, runs: int) -> float:
+    timings = []
+    for _ in range(runs):
+        _fresh_db()
+        t0 = time.perf_counter()
+        func(text)
+        timings.append(time.perf_counter() - t0)
+    return statistics.mean(timings)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark mémoire de l'ingestion RPC")
+    parser.add_argument("--deals", type=int, nargs="+", default=[100_000, 1000])
+    parser.add_argument("--runs", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    for n in args.deals:
+        text = rpc_payload(n)
+        print(f"{n} deals ({len(text) / 1e6:.1f} MB de JSON) :")
+        for name, func in VARIANTS.items():
+            peak = peak_mb(func, text)
+            elapsed = mean_s(func, text, args.runs)
+            print(f"  {name:<26} peak {peak:7.1f} MB | {elapsed:.2f} s")
+
+    db.close_all_connections()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,159 @@
+# scripts/bench_summary.py – benchmark de /api/summary sur des deals synthétiques
+#
+# Compare, sur une DB temporaire (jamais trades.db) :
+#   raw 3-query    : les 3 requêtes historiques directement sur la table deals
+#   rollup 3-query : les mêmes 3 requêtes sur le rollup deal_daily
+#   1-pass         : summary_from_db actuel (un seul GROUP BY symbol sur deal_daily)
+#
+# Usage :
+#   python scripts/bench_summary.py [--deals 1000000] [--symbols 8] [--years 3] [--runs 5]
+import sys
+import time
+import random
+import argparse
+import tempfile
+import statistics
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import dashboard_db as db  # noqa: E402
+
+ENTRY_TYPES = ("DEAL_ENTRY_IN", "DEAL_ENTRY_OUT", None)
+NON_TRADE = ", ".join(f"'{t}'" for t in db.NON_TRADE_TYPES)
+IS_EXIT = "COALESCE(entry_type, 'DEAL_ENTRY_OUT') = 'DEAL_ENTRY_OUT'"
+
+
+def synthetic_deals(n: int, n_symbols: int, years: float, seed: int = 42) -> Iterator[Dict[str, Any]]:
+    """`n` deals répartis uniformément sur les `years` dernières années."""
+    rng = random.Random(seed)
+    symbols = [f"SYM{i}" for i in range(n_symbols)]
+    now_ms = int(time.time() * 1000)
+    span_ms = int(years * 365 * 86400 * 1000)
+    for i in range(n):
+        yield {
+            "id": str(i),
+            "type": rng.choice(("DEAL_TYPE_BUY", "DEAL_TYPE_SELL")),
+            "time": db.iso_from_ms(now_ms - rng.randrange(span_ms)),
+            "symbol": rng.choice(symbols),
+            "entryType": rng.choice(ENTRY_TYPES),
+            "volume": 0.1,
+            "profit": round(rng.gauss(0.5, 20), 2),
+        }
+
+
+# ---------------------------------------------------------------------------
+# VARIANTES MESURÉES (même résultat, plans différents)
+# ---------------------------------------------------------------------------
+def summary_raw(days: int, symbol: Optional[str] = None) -> tuple:
+    """3 requêtes sur deals (avant les rollups)."""
+    cur = db.get_db_connection().cursor()
+    params: List[Any] = [db.window_start_ms(days)]
+    symbol_filter = ""
+    if symbol:
+        symbol_filter = "AND symbol = ?"
+        params.append(symbol.upper())
+    trade = f"profit IS NOT NULL AND (type IS NULL OR type NOT IN ({NON_TRADE}))"
+
+    cur.execute(
+        f"SELECT COUNT(*), SUM(profit) FROM deals WHERE time_ms >= ? {symbol_filter} AND {trade}",
+        params,
+    )
+    totals = tuple(cur.fetchone())
+    cur.execute(
+        f"""
+        SELECT SUM(profit > 0), SUM(profit <= 0) FROM deals
+        WHERE time_ms >= ? {symbol_filter} AND {trade} AND {IS_EXIT}
+        """,
+        params,
+    )
+    winrate = tuple(cur.fetchone())
+    cur.execute(
+        f"""
+        SELECT symbol, COUNT(*), SUM(profit) AS pnl FROM deals
+        WHERE time_ms >= ? AND {trade} AND symbol IS NOT NULL AND symbol != ''
+        GROUP BY symbol ORDER BY pnl DESC LIMIT 5
+        """,
+        params[:1],
+    )
+    return totals, winrate, [tuple(r) for r in cur.fetchall()]
+
+
+def summary_rollup_3q(days: int, symbol: Optional[str] = None) -> tuple:
+    """Les mêmes 3 requêtes sur deal_daily."""
+    cur = db.get_db_connection().cursor()
+    params: List[Any] = [db._window_start_day(days)]
+    symbol_filter = ""
+    if symbol:
+        symbol_filter = "AND symbol = ?"
+        params.append(symbol.upper())
+
+    cur.execute(f"SELECT SUM(nb_deals), SUM(pnl) FROM deal_daily WHERE day >= ? {symbol_filter}", params)
+    totals = tuple(cur.fetchone())
+    cur.execute(
+        f"SELECT SUM(exit_wins), SUM(exit_losses) FROM deal_daily WHERE day >= ? {symbol_filter}",
+        params,
+    )
+    winrate = tuple(cur.fetchone())
+    cur.execute(
+        """
+        SELECT symbol, SUM(nb_deals), SUM(pnl) AS pnl FROM deal_daily
+        WHERE day >= ? AND symbol != ''
+        GROUP BY symbol ORDER BY pnl DESC LIMIT 5
+        """,
+        params[:1],
+    )
+    return totals, winrate, [tuple(r) for r in cur.fetchall()]
+
+
+def summary_one_pass(days: int, symbol: Optional[str] = None) -> Dict[str, Any]:
+    """summary_from_db sans son cache par génération."""
+    return db.summary_from_db.__wrapped__(days=days, symbol=symbol)
+
+
+VARIANTS: Dict[str, Callable[..., Any]] = {
+    "raw 3-query": summary_raw,
+    "rollup 3-query": summary_rollup_3q,
+    "1-pass": summary_one_pass,
+}
+
+
+def mean_ms(func: Callable[..., Any], runs: int, **kwargs: Any) -> float:
+    func(**kwargs)  # chauffe (cache de pages SQLite)
+    timings = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        func(**kwargs)
+        timings.append((time.perf_counter() - t0) * 1000)
+    return statistics.mean(timings)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark de summary_from_db")
+    parser.add_argument("--deals", type=int, default=1_000_000)
+    parser.add_argument("--symbols", type=int, default=8)
+    parser.add_argument("--years", type=float, default=3)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--days", type=int, nargs="+", default=[30, 365])
+    args = parser.parse_args(argv)
+
+    db.DB_PATH = Path(tempfile.mkdtemp()) / "bench.db"
+    db.init_db()
+
+    t0 = time.perf_counter()
+    stats = db.ingest_deals(synthetic_deals(args.deals, args.symbols, args.years))
+    print(f"{stats['inserted']} deals synthétiques ingérés en {time.perf_counter() - t0:.1f}s ({db.DB_PATH})")
+
+    for days in args.days:
+        results = " | ".join(
+            f"{name} {mean_ms(func, args.runs, days=days):.1f} ms" for name, func in VARIANTS.items()
+        )
+        print(f"days={days}: {results}")
+
+    db.close_all_connections()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
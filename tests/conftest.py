@@ -0,0 +1,18 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import dashboard_db as db  # noqa: E402
+
+
+@pytest.fixture
+def fresh_db(tmp_path, monkeypatch):
+    """DB SQLite vide (migrations appliquées) dans un répertoire temporaire."""
+    monkeypatch.setattr(db, "DB_PATH", tmp_path / "trades.db")
+    db.close_all_connections()  # connexions du thread vers l'ancienne DB
+    db.init_db()
+    yield db.DB_PATH
+    db.close_all_connections()
@@ -0,0 +1,33 @@
+import threading
+
+import dashboard_db as db
+
+
+def _cache_kb(conn):
+    return -conn.execute("PRAGMA cache_size").fetchone()[0]
+
+
+def test_write_cache_is_released_after_ingest(fresh_db):
+    conn = db.get_db_connection()
+    assert _cache_kb(conn) == db.SQLITE_CACHE_SIZE_KB
+
+    seen = []
+    db.ingest_deals(
+        [{"id": "1", "time": "2025-01-15T10:00:00.000Z", "profit": 1.0}],
+        on_changed=lambda deals: seen.append(_cache_kb(conn)),
+    )
+    assert seen == [db.SQLITE_WRITE_CACHE_SIZE_KB]
+    assert _cache_kb(conn) == db.SQLITE_CACHE_SIZE_KB
+
+
+def test_reader_threads_get_the_small_cache(fresh_db):
+    sizes = []
+    threads = [
+        threading.Thread(target=lambda: sizes.append(_cache_kb(db.get_db_connection())))
+        for _ in range(4)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sizes == [db.SQLITE_CACHE_SIZE_KB] * 4
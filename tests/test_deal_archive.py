@@ -0,0 +1,81 @@
+import deal_archive
+import dashboard_db as db
+
+
+def _deal(deal_id, day, profit):
+    return {
+        "id": deal_id,
+        "type": "DEAL_TYPE_SELL",
+        "time": f"2025-01-{day:02d}T10:00:00.000Z",
+        "symbol": "EURUSD",
+        "entryType": "DEAL_ENTRY_OUT",
+        "profit": profit,
+    }
+
+
+def _archive(account_id, window, deals):
+    with deal_archive.open_segment(account_id, *window) as segment:
+        return db.ingest_deals(deals, account_id=account_id, on_changed=segment.write)
+
+
+def _profits():
+    cur = db.get_db_connection().cursor()
+    cur.execute("SELECT id, profit FROM deals ORDER BY id")
+    return {r["id"]: r["profit"] for r in cur.fetchall()}
+
+
+def test_replay_follows_write_order(fresh_db, tmp_path, monkeypatch):
+    monkeypatch.setattr(deal_archive, "ARCHIVE_DIR", tmp_path / "archive")
+    jan10 = db.to_epoch_ms("2025-01-10T00:00:00Z")
+    jan20 = db.to_epoch_ms("2025-01-20T00:00:00Z")
+    jan01 = db.to_epoch_ms("2025-01-01T00:00:00Z")
+
+    # sync incrémentale (fenêtre récente), puis réparation d'une fenêtre plus
+    # ancienne qui la recouvre et corrige le deal
+    _archive("A", (jan10, jan20), [_deal("1", 15, 10.0), _deal("2", 16, 5.0)])
+    _archive("A", (jan01, jan20), [_deal("1", 15, 99.0)])
+    assert _profits() == {"1": 99.0, "2": 5.0}
+
+    segments = deal_archive.list_segments("A")
+    assert [deal_archive.read_segment(p)[0]["start_ms"] for p in segments] == [jan10, jan01]
+
+    monkeypatch.setattr(db, "DB_PATH", tmp_path / "rebuilt.db")
+    db.close_all_connections()
+    totals = deal_archive.replay("A")
+    assert totals["segments"] == 2
+    assert _profits() == {"1": 99.0, "2": 5.0}
+
+
+def test_read_segment_header_then_deals(fresh_db, tmp_path, monkeypatch):
+    monkeypatch.setattr(deal_archive, "ARCHIVE_DIR", tmp_path / "archive")
+    _archive("A", (0, 1), [_deal("1", 2, 1.0)])
+    header, deals = deal_archive.read_segment(deal_archive.list_segments("A")[0])
+    assert header["account_id"] == "A"
+    assert [d["id"] for d in deals] == ["1"]
+
+
+def test_baseline_archives_history_already_in_db(fresh_db, tmp_path, monkeypatch):
+    monkeypatch.setattr(deal_archive, "ARCHIVE_DIR", tmp_path / "archive")
+    # installation existante : historique en DB, jamais archivé
+    db.ingest_deals([_deal("1", 2, 1.0), _deal("2", 3, 2.0)], account_id="A")
+    assert deal_archive.archive_stats()["incomplete"] == []
+    _archive("A", (0, 1), [_deal("2", 3, 7.0)])
+    assert deal_archive.archive_stats()["incomplete"] == ["A"]
+
+    assert deal_archive.ensure_baseline("A") == 2
+    assert deal_archive.ensure_baseline("A") == 0  # une seule fois
+    _archive("A", (0, 1), [_deal("1", 2, 5.0)])
+    assert deal_archive.archive_stats()["incomplete"] == []
+
+    monkeypatch.setattr(db, "DB_PATH", tmp_path / "rebuilt.db")
+    db.close_all_connections()
+    totals = deal_archive.replay("A")
+    assert totals["incomplete"] == []
+    assert _profits() == {"1": 5.0, "2": 7.0}
+
+
+def test_replay_reports_accounts_without_baseline(fresh_db, tmp_path, monkeypatch):
+    monkeypatch.setattr(deal_archive, "ARCHIVE_DIR", tmp_path / "archive")
+    _archive("B", (0, 1), [_deal("9", 4, 1.0)])
+    assert deal_archive.replay()["incomplete"] == ["B"]
+    assert deal_archive.main(["replay", "--db", str(tmp_path / "partial.db")]) == 1
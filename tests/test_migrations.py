@@ -0,0 +1,50 @@
+import dashboard_db as db
+
+
+def _deal(deal_id, profit):
+    return {
+        "id": deal_id,
+        "type": "DEAL_TYPE_SELL",
+        "time": "2025-01-15T10:00:00.000Z",
+        "symbol": "EURUSD",
+        "entryType": "DEAL_ENTRY_OUT",
+        "profit": profit,
+    }
+
+
+def _pnl_by_account():
+    cur = db.get_db_connection().cursor()
+    cur.execute("SELECT account_id, SUM(pnl) AS pnl FROM deal_daily GROUP BY account_id")
+    return {r["account_id"]: r["pnl"] for r in cur.fetchall()}
+
+
+def test_v6_without_account_env_claims_orphans_at_first_sync(tmp_path, monkeypatch):
+    monkeypatch.delenv("ACCOUNT_ID", raising=False)
+    monkeypatch.delenv("ACCOUNT_IDS", raising=False)
+    monkeypatch.setattr(db, "DB_PATH", tmp_path / "trades.db")
+    db.close_all_connections()
+
+    # installation antérieure au multi-comptes : schéma v5, deals sans compte
+    migrations = db.MIGRATIONS
+    monkeypatch.setattr(db, "MIGRATIONS", migrations[:5])
+    db.init_db()
+    db.ingest_deals([_deal("1", 10.0), _deal("2", -4.0)])
+    monkeypatch.setattr(db, "MIGRATIONS", migrations)
+
+    # migrations v6+ sans ACCOUNT_ID : orphelins conservés, état '' hérité
+    db.init_db()
+    assert db.get_db_connection().execute("PRAGMA user_version").fetchone()[0] == db.SCHEMA_VERSION
+    assert _pnl_by_account() == {"": 6.0}
+    assert db.get_sync_state("")["backfill_done"] == 1
+
+    # un autre compte que celui par défaut ne réclame rien
+    monkeypatch.setenv("ACCOUNT_ID", "A")
+    assert db.claim_orphan_deals("B") == 0
+
+    # première synchro du compte par défaut : deals, rollups et état rattachés
+    assert db.claim_orphan_deals("A") == 2
+    assert _pnl_by_account() == {"A": 6.0}
+    assert db.get_sync_state("A")["backfill_done"] == 1
+    assert db.get_sync_state("") == {}
+    assert db.claim_orphan_deals("A") == 0
+    db.close_all_connections()